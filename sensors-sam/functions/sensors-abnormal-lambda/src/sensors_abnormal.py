@@ -1,12 +1,44 @@
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from helpers.logs import get_logger
 from helpers.config import get_env_var
 from helpers.sns_common import sns_client
-from helpers.dynamo_db import get_sensor_parameters
+from helpers.dynamo_db import get_sensor_parameters, get_all_sensor_parameters, batch_get_items, parameters_table_client
+from helpers.metrics import (
+    metrics, log_metrics,
+    RECORDS_IN, RECORDS_FAILED, ANOMALIES_LOW, ANOMALIES_HIGH, ANOMALIES_DRIFT, ANOMALIES_STUCK, ANOMALIES_RATE,
+    CACHE_HITS, CACHE_MISSES, SNAPSHOT_HITS
+)
+from helpers.tracing import span, traced, set_trace_id, trace_id_from_record, trace_attributes
+from helpers.capture import capture_events
+from helpers.limits_snapshot import get_limits_snapshot
+from helpers.dedup import Deduplicator
+from helpers.concurrency import process_grouped
+from helpers.sharding import check_shard, owns_sensor
+from helpers.warmup import register_warmup, run_warmup
+from helpers.online_detector import (
+    DETECTOR_ENABLED, DETECTOR_CHECKPOINT_SECONDS, ALERT_TYPE_DRIFT, ALERT_TYPE_STUCK, ALERT_TYPE_RATE,
+    DetectorConfig, OnlineDetector, load_checkpoint, save_checkpoint
+)
 
 logger = get_logger("sensors-abnormal")
 
+# records of different sensors are processed on this many threads, 1 keeps the sequential loop
+ABNORMAL_CONCURRENCY = int(os.getenv("ABNORMAL_CONCURRENCY", default="1"))
+PUBLISHED_ALERTS_SIZE = int(os.getenv("PUBLISHED_ALERTS_SIZE", default="10000")) # failed packages kept per container
+
 _sensor_limits: dict[str, tuple[int, int]] = {}
+# None for sensors without online detection, missing for sensors not loaded yet
+_detector_configs: dict[str, DetectorConfig | None] = {}
+_detector: OnlineDetector | None = None
+_detector_saved_at = 0.0
+deduplicator = Deduplicator("abnormal")
+# alert types already published per package whose record has not succeeded yet, skipped by its retry
+_published_alerts: OrderedDict[str, set[str]] = OrderedDict()
+_published_alerts_lock = threading.Lock()
 
 def get_low_topic_arn() -> str:
     return get_env_var("SNS_ABNORMAL_LOW_TOPIC_ARN")
@@ -15,44 +47,196 @@ def get_high_topic_arn() -> str:
     return get_env_var("SNS_ABNORMAL_HIGH_TOPIC_ARN")
 
 def get_sensor_limits(sensor_id: str) -> tuple[int, int]:
-    if sensor_id not in _sensor_limits:
+    """Limits from the in-memory cache, then the layer snapshot, then DynamoDB."""
+    if sensor_id in _sensor_limits:
+        metrics.count(CACHE_HITS)
+        return _sensor_limits[sensor_id]
+    snapshot = get_limits_snapshot()
+    limits = snapshot.get(sensor_id) if snapshot else None
+    if limits is not None:
+        metrics.count(SNAPSHOT_HITS)
+        _sensor_limits[sensor_id] = limits
+    else:
+        metrics.count(CACHE_MISSES)
         params = get_sensor_parameters(sensor_id)
         if not params:
             raise ValueError(f"Sensor bounds not found for sensor_id: {sensor_id}")
         min_value = int(params["min_value"])
         max_value = int(params["max_value"])
         _sensor_limits[sensor_id] = (min_value, max_value)
+        _detector_configs[sensor_id] = DetectorConfig.from_params(params)
     return _sensor_limits[sensor_id]
 
-def publish_abnormal_data(topic_arn: str, sensor_data: dict, deviation: int) -> None:
+def prefetch_sensor_limits(sensor_ids: set[str]) -> None:
+    """
+    Loads the limits, and with online detection the detector configs, of
+    uncached sensors with BatchGetItem before the records are processed concurrently.
+    """
+    snapshot = get_limits_snapshot()
+    missing = [
+        sensor_id for sensor_id in sensor_ids
+        if (sensor_id not in _sensor_limits and not (snapshot and snapshot.get(sensor_id)))
+        or (DETECTOR_ENABLED and sensor_id not in _detector_configs)
+    ]
+    if not missing:
+        return
+    try:
+        items = batch_get_items(parameters_table_client.table_name, [{"sensor_id": sensor_id} for sensor_id in missing])
+    except Exception as e:
+        logger.error("Error prefetching sensor limits: %s", e)
+        return
+    for params in items:
+        _sensor_limits[params["sensor_id"]] = (int(params["min_value"]), int(params["max_value"]))
+        _detector_configs[params["sensor_id"]] = DetectorConfig.from_params(params)
+    for sensor_id in missing:
+        # unknown sensors are not looked up again for their detector config
+        _detector_configs.setdefault(sensor_id, None)
+
+def warm_sensor_limits() -> None:
+    """Opens the limits snapshot, or without one caches the limits of the first scan page of owned sensors."""
+    if get_limits_snapshot() is not None:
+        return
+    for params in get_all_sensor_parameters():
+        if owns_sensor(params["sensor_id"]):
+            _sensor_limits[params["sensor_id"]] = (int(params["min_value"]), int(params["max_value"]))
+            _detector_configs[params["sensor_id"]] = DetectorConfig.from_params(params)
+
+register_warmup("sensor_limits", warm_sensor_limits)
+
+def get_detector() -> OnlineDetector:
+    """The detector of this container, restored from the last checkpoint on first use."""
+    global _detector, _detector_saved_at
+    if _detector is None:
+        _detector = load_checkpoint("abnormal")
+        _detector_saved_at = time.monotonic()
+    return _detector
+
+def checkpoint_detector() -> None:
+    global _detector_saved_at
+    if _detector is not None and time.monotonic() - _detector_saved_at >= DETECTOR_CHECKPOINT_SECONDS:
+        with span("checkpoint"):
+            save_checkpoint(_detector, "abnormal")
+        _detector_saved_at = time.monotonic()
+
+def warm_detector_state() -> None:
+    if DETECTOR_ENABLED:
+        get_detector()
+
+register_warmup("detector_state", warm_detector_state)
+
+def get_record_sensor_id(record: dict) -> str | None:
+    try:
+        sensor_id = json.loads(record.get("body") or "").get("sensor_id")
+    except (ValueError, AttributeError):
+        return None
+    return None if sensor_id is None else str(sensor_id)
+
+ALERT_TYPE_LOW = "low"
+ALERT_TYPE_HIGH = "high"
+DETECTION_METRICS = {ALERT_TYPE_DRIFT: ANOMALIES_DRIFT, ALERT_TYPE_STUCK: ANOMALIES_STUCK, ALERT_TYPE_RATE: ANOMALIES_RATE}
+
+def publish_abnormal_data(topic_arn: str, sensor_data: dict, deviation: int | float, alert_type: str, score: float | None = None) -> bool:
+    """Publishes the alert unless a failed attempt of the same package already did; returns whether it was published."""
+    package_id = sensor_data.get("package_id")
+    if package_id:
+        with _published_alerts_lock:
+            if alert_type in _published_alerts.get(package_id, ()):
+                logger.debug("Alert %s of package %s already published", alert_type, package_id)
+                return False
     abnormal_data = {
         **sensor_data,
-        "deviation": deviation
+        "deviation": deviation,
+        "alert_type": alert_type
     }
-    sns_client.publish_message(topic_arn, json.dumps(abnormal_data))
+    if score is not None:
+        abnormal_data["score"] = score
+    with span("publish"):
+        sns_client.publish_message(topic_arn, json.dumps(abnormal_data), attributes=trace_attributes())
+    if package_id:
+        with _published_alerts_lock:
+            _published_alerts.setdefault(package_id, set()).add(alert_type)
+            _published_alerts.move_to_end(package_id)
+            while len(_published_alerts) > PUBLISHED_ALERTS_SIZE:
+                _published_alerts.popitem(last=False)
+    return True
+
+def forget_published_alerts(package_id: str | None) -> None:
+    if package_id and _published_alerts:
+        with _published_alerts_lock:
+            _published_alerts.pop(package_id, None)
 
 def process_record(record: dict) -> None:
     message = record.get("body")
     logger.debug("Processing message: %s", message)
     
-    sensor_data = json.loads(message or "") # Parse the message (assuming it's JSON)
+    with span("decode"):
+        sensor_data = json.loads(message or "") # Parse the message (assuming it's JSON)
+    set_trace_id(trace_id_from_record(record, sensor_data))
     package_id = sensor_data.get("package_id")
     logger.debug("Package ID: %s", package_id)
     sensor_id, sensor_value = sensor_data.get("sensor_id"), sensor_data.get("value")
     if sensor_id is None or sensor_value is None:
         raise ValueError(f"Incorrect sensor data in package: {package_id}")
-    
-    min_value, max_value = get_sensor_limits(sensor_id)
+    check_shard(sensor_id)
+    if not deduplicator.claim(package_id):
+        return
+    try:
+        check_sensor_value(sensor_data, sensor_id, sensor_value)
+    except Exception:
+        deduplicator.release(package_id)
+        raise
+    forget_published_alerts(package_id)
+    deduplicator.complete(package_id)
+
+def check_sensor_value(sensor_data: dict, sensor_id: str, sensor_value) -> None:
+    with span("lookup"):
+        min_value, max_value = get_sensor_limits(sensor_id)
     logger.debug("Sensor value: %s, min_value: %s, max_value: %s", sensor_value, min_value, max_value)
     if sensor_value < min_value:
-        publish_abnormal_data(get_low_topic_arn(), sensor_data, min_value - sensor_value)
+        if publish_abnormal_data(get_low_topic_arn(), sensor_data, min_value - sensor_value, ALERT_TYPE_LOW):
+            metrics.count(ANOMALIES_LOW)
         logger.debug("Sensor %s value %s is below limit: %s", sensor_id, sensor_value, min_value)
     elif sensor_value > max_value:
-        publish_abnormal_data(get_high_topic_arn(), sensor_data, sensor_value - max_value)
+        if publish_abnormal_data(get_high_topic_arn(), sensor_data, sensor_value - max_value, ALERT_TYPE_HIGH):
+            metrics.count(ANOMALIES_HIGH)
         logger.debug("Sensor %s value %s is above limit: %s", sensor_id, sensor_value, max_value)
     else:
         logger.debug("Sensor %s value %s is within limits: %s", sensor_id, sensor_value, min_value, max_value)
+    if DETECTOR_ENABLED:
+        detect_statistical_anomalies(sensor_data, sensor_id, sensor_value)
 
+def get_detector_config(sensor_id: str) -> DetectorConfig | None:
+    """Cached with the limits; sensors served from the limits snapshot are looked up once."""
+    if sensor_id not in _detector_configs:
+        try:
+            params = get_sensor_parameters(sensor_id)
+        except Exception as e:
+            logger.error("Error loading detector config of sensor %s: %s", sensor_id, e)
+            return None
+        _detector_configs[sensor_id] = DetectorConfig.from_params(params) if params else None
+    return _detector_configs[sensor_id]
+
+def detect_statistical_anomalies(sensor_data: dict, sensor_id: str, sensor_value) -> None:
+    """Drift, rate and stuck alerts of the online detector for sensors selected in their parameters."""
+    config = get_detector_config(sensor_id)
+    if config is None:
+        return
+    timestamp = sensor_data.get("timestamp")
+    detector = get_detector()
+    with span("detect"):
+        detections, state = detector.score(sensor_id, float(sensor_value), timestamp if isinstance(timestamp, (int, float)) else None, config)
+    for detection in detections:
+        # readings moving down go to the low topic, the rest to the high topic
+        topic_arn = get_low_topic_arn() if detection.deviation < 0 else get_high_topic_arn()
+        if publish_abnormal_data(topic_arn, sensor_data, round(abs(detection.deviation), 3), detection.alert_type, round(detection.score, 3)):
+            metrics.count(DETECTION_METRICS[detection.alert_type])
+        logger.debug("Sensor %s value %s raised %s with score %s", sensor_id, sensor_value, detection.alert_type, detection.score)
+    # a failed publish leaves the state as it was for the retried reading
+    detector.apply(state)
+
+@log_metrics("sensors-abnormal")
+@capture_events("abnormal")
+@traced
 def lambda_handler(event, context) -> dict:
     """
     Lambda handler for detecting abnormal sensor data.
@@ -63,16 +247,27 @@ def lambda_handler(event, context) -> dict:
         records = event.get("Records", [])
         logger.debug("%d records received", len(records))
         batch_item_failures = []
-        for record in records:
-            messageId = record.get("messageId")
-            logger.debug("Message ID: %s", messageId)
-            try:
-                process_record(record)
-            except Exception as e:
+        if ABNORMAL_CONCURRENCY > 1:
+            with span("prefetch"):
+                prefetch_sensor_limits({sensor_id for record in records if (sensor_id := get_record_sensor_id(record))})
+            # shared clients and state are created here rather than racing in the worker threads
+            sns_client.get_client()
+            if DETECTOR_ENABLED:
+                get_detector()
+        errors = process_grouped(records, get_record_sensor_id, process_record, ABNORMAL_CONCURRENCY)
+        if DETECTOR_ENABLED:
+            checkpoint_detector()
+        for record, error in zip(records, errors):
+            if error is not None:
+                messageId = record.get("messageId")
                 batch_item_failures.append({"itemIdentifier": messageId})
-                logger.error("Error processing message %s: %s", messageId, e)
+                logger.error("Error processing message %s: %s", messageId, error)
+        metrics.count(RECORDS_IN, len(records))
+        metrics.count(RECORDS_FAILED, len(batch_item_failures))
         logger.info("%d messages processed successfully, %d messages failed", len(records) - len(batch_item_failures), len(batch_item_failures))
         return {"batchItemFailures": batch_item_failures}
     except Exception as e:
         logger.error("Error processing event: %s", e)
         return {}
+
+run_warmup("sns_client", "dynamodb", "sensor_limits", "detector_state")
@@ -0,0 +1,151 @@
+import gzip
+import json
+import time
+import uuid
+from helpers.logs import get_logger
+from helpers.object_store import get_object_store_writer
+from helpers.metrics import metrics, log_metrics, RECORDS_IN, RECORDS_FAILED, ANOMALIES_LOW, ANOMALIES_HIGH
+from helpers.tracing import span, traced
+
+logger = get_logger("alert-sink")
+
+ALERT_STORE_URI_ENV = "ALERT_STORE_URI"
+ALERT_TYPE_LOW = "low"
+ALERT_TYPE_HIGH = "high"
+ALERT_TYPE_UNKNOWN = "unknown"
+LOW_TOPIC_SUFFIX = "-lo"
+HIGH_TOPIC_SUFFIX = "-hi"
+MAX_PACKAGE_IDS = 100 # package ids kept per aggregate
+
+class AlertAggregate:
+    def __init__(self, sensor_id: str, alert_type: str):
+        self.sensor_id = sensor_id
+        self.alert_type = alert_type
+        self.count = 0
+        self.min_value = None
+        self.max_value = None
+        self.max_deviation = None
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.package_ids: list[str] = []
+
+    def add(self, payload: dict) -> None:
+        self.count += 1
+        value, deviation, timestamp = payload.get("value"), payload.get("deviation"), payload.get("timestamp")
+        if isinstance(value, (int, float)):
+            self.min_value = value if self.min_value is None else min(self.min_value, value)
+            self.max_value = value if self.max_value is None else max(self.max_value, value)
+        if isinstance(deviation, (int, float)):
+            self.max_deviation = deviation if self.max_deviation is None else max(self.max_deviation, deviation)
+        if isinstance(timestamp, (int, float)):
+            self.first_timestamp = timestamp if self.first_timestamp is None else min(self.first_timestamp, timestamp)
+            self.last_timestamp = timestamp if self.last_timestamp is None else max(self.last_timestamp, timestamp)
+        package_id = payload.get("package_id")
+        if package_id and len(self.package_ids) < MAX_PACKAGE_IDS:
+            self.package_ids.append(package_id)
+
+    def to_dict(self) -> dict:
+        return {
+            "sensor_id": self.sensor_id,
+            "alert_type": self.alert_type,
+            "count": self.count,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "max_deviation": self.max_deviation,
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "package_ids": self.package_ids,
+        }
+
+def get_record_message(record: dict) -> tuple[str, str]:
+    """Returns the message and the source topic ARN of an SNS or a raw SQS record."""
+    if "Sns" in record:
+        sns: dict = record["Sns"]
+        return sns.get("Message", ""), sns.get("TopicArn", "")
+    return record.get("body", ""), ""
+
+def get_alert_type(payload: dict, topic_arn: str) -> str:
+    alert_type = payload.get("alert_type")
+    if alert_type:
+        return alert_type
+    if topic_arn.endswith(LOW_TOPIC_SUFFIX):
+        return ALERT_TYPE_LOW
+    if topic_arn.endswith(HIGH_TOPIC_SUFFIX):
+        return ALERT_TYPE_HIGH
+    return ALERT_TYPE_UNKNOWN
+
+def aggregate_alerts(records: list[dict]) -> dict[tuple[str, str], AlertAggregate]:
+    aggregates: dict[tuple[str, str], AlertAggregate] = {}
+    for record in records:
+        message, topic_arn = get_record_message(record)
+        try:
+            payload = json.loads(message)
+        except json.JSONDecodeError:
+            logger.warning("Skipping non-JSON message: %s", message)
+            metrics.count(RECORDS_FAILED)
+            continue
+
+        sensor_id = payload.get("sensor_id")
+        if sensor_id is None:
+            logger.warning("Skipping message without sensor ID: %s", message)
+            metrics.count(RECORDS_FAILED)
+            continue
+        alert_type = get_alert_type(payload, topic_arn)
+        key = (str(sensor_id), alert_type)
+        if key not in aggregates:
+            aggregates[key] = AlertAggregate(*key)
+        aggregates[key].add(payload)
+        if alert_type == ALERT_TYPE_LOW:
+            metrics.count(ANOMALIES_LOW)
+        elif alert_type == ALERT_TYPE_HIGH:
+            metrics.count(ANOMALIES_HIGH)
+    return aggregates
+
+def build_alerts_object(aggregates: list[AlertAggregate], written_at: float) -> bytes:
+    lines = [
+        json.dumps({**aggregate.to_dict(), "written_at": written_at}, separators=(",", ":"))
+        for aggregate in aggregates
+    ]
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+
+def build_object_key(written_at: float) -> str:
+    partition = time.strftime("dt=%Y-%m-%d/hour=%H", time.gmtime(written_at))
+    return f"alerts/{partition}/{uuid.uuid4().hex}.ndjson.gz"
+
+def write_alerts(aggregates: list[AlertAggregate]) -> str:
+    written_at = time.time()
+    writer = get_object_store_writer(ALERT_STORE_URI_ENV)
+    return writer.put_object(build_object_key(written_at), build_alerts_object(aggregates, written_at), "application/x-ndjson")
+
+@log_metrics("sensors-alert-sink")
+@traced
+def lambda_handler(event, context) -> dict:
+    """
+    Lambda handler for storing abnormal sensor data.
+    Consumes sqs-sensors-alerts (or the abnormal SNS topics directly), aggregates
+    alerts per sensor and writes one NDJSON object per invocation.
+    """
+    records = event.get("Records", [])
+    metrics.count(RECORDS_IN, len(records))
+    with span("aggregate"):
+        aggregates = list(aggregate_alerts(records).values())
+    for aggregate in aggregates:
+        logger.info(
+            "Sensor %s abnormal %s values: count = %d, min = %s, max = %s, max deviation = %s",
+            aggregate.sensor_id, aggregate.alert_type.upper(), aggregate.count,
+            aggregate.min_value, aggregate.max_value, aggregate.max_deviation
+        )
+    if not aggregates:
+        return {"batchItemFailures": []}
+
+    try:
+        with span("write"):
+            location = write_alerts(aggregates)
+        logger.info("%d alerts of %d sensors written to %s", sum(a.count for a in aggregates), len(aggregates), location)
+    except Exception as e:
+        logger.error("Error writing alerts: %s", e)
+        if any("Sns" in record for record in records):
+            raise
+        metrics.count(RECORDS_FAILED, len(records))
+        return {"batchItemFailures": [{"itemIdentifier": record.get("messageId")} for record in records]}
+    return {"batchItemFailures": []}
@@ -1,58 +1,107 @@
-import os
 import json
-import boto3
+import os
 from helpers.logs import get_logger
+from helpers.config import get_env_var
+from helpers.sns_common import sns_client
+from helpers.metrics import metrics, log_metrics, RECORDS_IN, RECORDS_FAILED
+from helpers.tracing import span, traced
+from helpers.capture import capture_events
+from helpers.dedup import Deduplicator
+from helpers.concurrency import process_grouped
+from helpers.sharding import check_shard
+from helpers.warmup import run_warmup
+
+logger = get_logger("sensors-avg")
+
+deduplicator = Deduplicator("avg")
+
+# messages of different sensors are published on this many threads
+AVG_CONCURRENCY = int(os.getenv("AVG_CONCURRENCY", default="1"))
+
+def get_average_topic_arn() -> str:
+    return get_env_var("SNS_TOPIC_ARN")
+
+AVERAGE_SUBJECT = "Sensor Average Data"
 
-logger = get_logger(__name__)
-sns_client = boto3.client('sns')
+def build_average_message(sensor_data: dict) -> str:
+    """One message per reading, carrying the reading as original_data."""
+    return json.dumps({
+        "type": "average",
+        "original_data": sensor_data,
+        "processed_by": "sensors-avg-lambda",
+    })
 
-def lambda_handler(event, context):
+def get_record_message(record: dict) -> str:
+    if "Sns" in record:
+        return record["Sns"].get("Message", "")
+    return record.get("body", "")
+
+class AverageMessage:
+    def __init__(self, message_id: str | None, sensor_id: str, package_id: str | None, message: str):
+        self.message_id = message_id
+        self.sensor_id = sensor_id
+        self.package_id = package_id
+        self.message = message
+
+def process_record(record: dict) -> AverageMessage | None:
+    """Returns the message of the reading of the record, or None for an already published package."""
+    sensor_data = json.loads(get_record_message(record) or "")
+    sensor_id = sensor_data.get("sensor_id")
+    package_id = sensor_data.get("package_id")
+    if sensor_id is None:
+        raise ValueError(f"Incorrect sensor data in package: {package_id}")
+    check_shard(sensor_id)
+    if not deduplicator.claim(package_id):
+        return None
+    return AverageMessage(record.get("messageId"), str(sensor_id), package_id, build_average_message(sensor_data))
+
+def publish_average(average: AverageMessage) -> None:
+    with span("publish"):
+        sns_client.publish_message(get_average_topic_arn(), average.message, subject=AVERAGE_SUBJECT)
+
+@log_metrics("sensors-avg")
+@capture_events("avg")
+@traced
+def lambda_handler(event, context) -> dict:
     """
     Lambda handler for processing sensor data and calculating averages.
-    Subscribes to sns-sensors-ingress and publishes to sns-sensors-average.
+    Subscribes to sns-sensors-ingress and publishes one message per reading
+    to sns-sensors-average.
     """
-    try:
-        logger.debug("EVENT: %s", event)
-        
-        sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
-        if not sns_topic_arn:
-            raise ValueError("SNS_TOPIC_ARN environment variable not set")
-        
-        # Process each SNS record
-        for record in event.get('Records', []):
-            if record.get('EventSource') == 'aws:sns':
-                message = record['Sns']['Message']
-                logger.info("Processing message: %s", message)
-                
-                # Parse the message (assuming it's JSON)
-                try:
-                    sensor_data = json.loads(message)
-                except json.JSONDecodeError:
-                    logger.warning("Message is not valid JSON, using raw message")
-                    sensor_data = message
-                
-                # Calculate average (placeholder logic)
-                # TODO: Implement actual average calculation logic
-                avg_data = {
-                    'type': 'average',
-                    'original_data': sensor_data,
-                    'processed_by': 'sensors-avg-lambda'
-                }
-                
-                # Publish to sns-sensors-average
-                response = sns_client.publish(
-                    TopicArn=sns_topic_arn,
-                    Message=json.dumps(avg_data),
-                    Subject='Sensor Average Data'
-                )
-                
-                logger.info("Published to SNS topic %s: %s", sns_topic_arn, response['MessageId'])
-        
-        return {
-            'statusCode': 200,
-            'body': json.dumps('Successfully processed sensor data')
-        }
-        
-    except Exception as e:
-        logger.error("Error processing sensor data: %s", e)
-        raise
+    logger.debug("EVENT: %s", event)
+    records = event.get("Records", [])
+    metrics.count(RECORDS_IN, len(records))
+    averages: list[AverageMessage] = []
+    batch_item_failures = []
+    with span("decode"):
+        for record in records:
+            message_id = record.get("messageId")
+            try:
+                average = process_record(record)
+            except Exception as e:
+                batch_item_failures.append({"itemIdentifier": message_id})
+                logger.error("Error processing message %s: %s", message_id, e)
+                continue
+            if average is not None:
+                averages.append(average)
+
+    if AVG_CONCURRENCY > 1:
+        sns_client.get_client()
+    # messages of one sensor are published in order, different sensors concurrently
+    errors = process_grouped(averages, lambda average: average.sensor_id, publish_average, AVG_CONCURRENCY)
+    completed, released = [], []
+    for average, error in zip(averages, errors):
+        if error is not None:
+            logger.error("Error publishing message %s: %s", average.message_id, error)
+            batch_item_failures.append({"itemIdentifier": average.message_id})
+            released.append(average.package_id)
+        else:
+            completed.append(average.package_id)
+    if deduplicator.enabled:
+        deduplicator.complete_many(completed)
+        deduplicator.release_many(released)
+    metrics.count(RECORDS_FAILED, len(batch_item_failures))
+    logger.info("%d messages published, %d messages failed", len(averages) - len(released), len(batch_item_failures))
+    return {"batchItemFailures": batch_item_failures}
+
+run_warmup("sns_client")
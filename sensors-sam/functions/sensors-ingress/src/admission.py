@@ -0,0 +1,136 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from botocore.exceptions import BotoCoreError, ClientError
+from helpers.logs import get_logger
+from helpers.dynamo_db import get_dynamodb_table
+from helpers.metrics import metrics, REQUESTS_THROTTLED
+from helpers.warmup import register_warmup
+
+logger = get_logger(__name__)
+
+# rate in requests per second, 0 disables the limit
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE", default="0"))
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", default="0")) # defaults to 2x rate
+ADMISSION_SENSOR_RATE = float(os.getenv("ADMISSION_SENSOR_RATE", default="0"))
+ADMISSION_SENSOR_BURST = float(os.getenv("ADMISSION_SENSOR_BURST", default="0"))
+ADMISSION_MAX_KEYS = int(os.getenv("ADMISSION_MAX_KEYS", default="100000")) # buckets kept per container
+# shared fixed-window counters across containers, disabled if empty
+ADMISSION_TABLE_NAME = os.getenv("ADMISSION_TABLE_NAME", default="")
+ADMISSION_WINDOW_SECONDS = int(os.getenv("ADMISSION_WINDOW_SECONDS", default="1"))
+CONDITIONAL_CHECK_FAILED = "ConditionalCheckFailedException"
+
+class RateLimitedError(Exception):
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {key}")
+        self.key = key
+        self.retry_after = retry_after
+
+class TokenBucketLimiter:
+    """In-process token buckets per key, least recently used buckets are evicted past max_keys."""
+    def __init__(self, rate: float, burst: float, max_keys: int = ADMISSION_MAX_KEYS):
+        self.rate = rate
+        self.burst = max(1.0, burst or 2 * rate)
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def acquire(self, key: str, now: float | None = None) -> float:
+        """Takes a token and returns 0, or returns the seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+class SharedWindowLimiter:
+    """Fixed-window request counters in DynamoDB shared by all containers."""
+    def __init__(self, table_name: str, rate: float, window_seconds: int = ADMISSION_WINDOW_SECONDS):
+        self.table_name = table_name
+        self.window_seconds = window_seconds
+        self.limit = max(1, math.ceil(rate * window_seconds))
+
+    def acquire(self, key: str, now: float | None = None) -> float:
+        now = time.time() if now is None else now
+        window_start = int(now // self.window_seconds) * self.window_seconds
+        try:
+            get_dynamodb_table(self.table_name).update_item(
+                Key={"limit_key": f"{key}#{window_start}"},
+                UpdateExpression="ADD request_count :one SET expires_at = :expires_at",
+                ConditionExpression="attribute_not_exists(request_count) OR request_count < :limit",
+                ExpressionAttributeValues={":one": 1, ":limit": self.limit, ":expires_at": window_start + 10 * self.window_seconds},
+            )
+            return 0.0
+        except (BotoCoreError, ClientError) as e:
+            if isinstance(e, ClientError) and e.response.get("Error", {}).get("Code") == CONDITIONAL_CHECK_FAILED:
+                return window_start + self.window_seconds - now
+            # admission is best effort, an unavailable counter admits the request
+            logger.error("Error updating shared rate counter %s: %s", key, e)
+            return 0.0
+
+def create_limiters(rate: float, burst: float) -> list:
+    if rate <= 0:
+        return []
+    limiters: list = [TokenBucketLimiter(rate, burst)]
+    if ADMISSION_TABLE_NAME:
+        limiters.append(SharedWindowLimiter(ADMISSION_TABLE_NAME, rate))
+    return limiters
+
+_client_limiters = create_limiters(ADMISSION_CLIENT_RATE, ADMISSION_CLIENT_BURST)
+_sensor_limiters = create_limiters(ADMISSION_SENSOR_RATE, ADMISSION_SENSOR_BURST)
+
+def warm_admission_table() -> None:
+    if ADMISSION_TABLE_NAME and (_client_limiters or _sensor_limiters):
+        get_dynamodb_table(ADMISSION_TABLE_NAME)
+
+register_warmup("admission_table", warm_admission_table)
+
+def get_client_key(claims: dict) -> str | None:
+    """
+    The user (sub) of the verified access token. All user tokens carry the
+    same app client_id, which only keys client_credentials tokens without a sub.
+    """
+    client_key = claims.get("sub") or claims.get("client_id")
+    return f"client:{client_key}" if client_key else None
+
+def get_sensor_key(event: dict) -> str | None:
+    try:
+        sensor_id = json.loads(event.get("body") or "").get("sensor_id")
+    except (ValueError, AttributeError):
+        return None
+    return f"sensor:{sensor_id}" if sensor_id is not None else None
+
+def acquire(limiters: list, key: str | None) -> None:
+    if key is None:
+        return
+    for limiter in limiters:
+        retry_after = limiter.acquire(key)
+        if retry_after > 0:
+            metrics.count(REQUESTS_THROTTLED)
+            raise RateLimitedError(key, retry_after)
+
+def check_admission(event: dict, claims: dict, check_sensor: bool = True) -> None:
+    """
+    Raises RateLimitedError when the client or the sensor of the request is over
+    its rate. Runs after auth so that a forged token cannot spend another user's rate.
+    """
+    if _client_limiters:
+        acquire(_client_limiters, get_client_key(claims))
+    if check_sensor and _sensor_limiters:
+        acquire(_sensor_limiters, get_sensor_key(event))
+
+def get_retry_after_header(error: RateLimitedError) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
@@ -1,13 +1,22 @@
+import os
+import time
 from typing import Optional
 from jose import ExpiredSignatureError, JWTError, jwt
 import requests
 from helpers.config import get_env_var, get_region, InternalServerError, ConfigurationError
 from helpers.logs import get_logger
+from helpers.warmup import register_warmup
 
 logger = get_logger("auth")
 
 _auth_config: dict = {}
 
+COGNITO_KEYS_TTL_SECONDS = float(os.getenv("COGNITO_KEYS_TTL_SECONDS", default="3600"))
+COGNITO_KEYS_MIN_REFRESH_SECONDS = float(os.getenv("COGNITO_KEYS_MIN_REFRESH_SECONDS", default="60"))
+
+_cognito_keys: dict[str, dict] = {}
+_cognito_keys_fetched_at: float | None = None
+
 def _init_auth_config() -> dict:
     _auth_config["region_id"] = get_region()
     _auth_config["user_pool_id"] = get_env_var("COGNITO_USER_POOL_ID")
@@ -52,6 +61,25 @@ def _fetch_cognito_keys() -> list[dict]:
         logger.error("Unexpected error fetching Cognito keys: %s", e)
         raise InternalServerError(f"Error fetching Cognito keys: {e}")
 
+def get_cognito_key(kid: str) -> Optional[dict]:
+    """
+    Returns the JWKS key by kid from the cache, refreshing it after the TTL or,
+    for an unknown kid (key rotation), at most once per COGNITO_KEYS_MIN_REFRESH_SECONDS.
+    """
+    age = time.monotonic() - _cognito_keys_fetched_at if _cognito_keys_fetched_at is not None else None
+    if age is None or age >= COGNITO_KEYS_TTL_SECONDS or (kid not in _cognito_keys and age >= COGNITO_KEYS_MIN_REFRESH_SECONDS):
+        refresh_cognito_keys()
+    return _cognito_keys.get(kid)
+
+def refresh_cognito_keys() -> None:
+    global _cognito_keys_fetched_at
+    keys = _fetch_cognito_keys()
+    _cognito_keys.clear()
+    _cognito_keys.update((k["kid"], k) for k in keys)
+    _cognito_keys_fetched_at = time.monotonic()
+
+register_warmup("cognito_keys", refresh_cognito_keys)
+
 def _extract_kid(token: str) -> str:
     header: dict = jwt.get_unverified_header(token)
     key_id = header.get("kid")
@@ -64,9 +92,7 @@ def get_user_token(event: dict) -> dict:
     token = get_auth_token(event)
     logger.debug(".get_current_token token=%s...%s", token[:5], token[-5:])
     kid = _extract_kid(token)
-    keys = _fetch_cognito_keys()
-
-    public_key: Optional[dict] = next((k for k in keys if k["kid"] == kid), None)
+    public_key = get_cognito_key(kid)
 
     if not public_key:
         logger.error("Public key is not found")
@@ -99,6 +125,8 @@ def get_user_token(event: dict) -> dict:
     
     return payload
 
-def authenticate_user(event: dict) -> None:
-    get_user_token(event)
-    logger.debug("User authenticated successfully")
\ No newline at end of file
+def authenticate_user(event: dict) -> dict:
+    """Returns the verified claims of the access token."""
+    payload = get_user_token(event)
+    logger.debug("User authenticated successfully")
+    return payload
\ No newline at end of file
@@ -3,6 +3,8 @@ import uuid
 from helpers.logs import get_logger
 from helpers.sns_common import sns_client
 from helpers.config import InternalServerError, get_env_var
+from helpers.tracing import trace_attributes
+from helpers.sharding import shard_attributes
 
 class UnsupportedEndpointError(Exception):
     pass
@@ -12,8 +14,8 @@ class InvalidRequestError(Exception):
 
 logger = get_logger(__name__)
 
-def build_response(status_code: int, message: str) -> dict:
-    return {
+def build_response(status_code: int, message: str, headers: dict | None = None) -> dict:
+    response = {
         "statusCode": status_code,
         "body": json.dumps(
             {
@@ -21,6 +23,9 @@ def build_response(status_code: int, message: str) -> dict:
             }
         ),
     }
+    if headers:
+        response["headers"] = headers
+    return response
 
 def get_path_and_method(event: dict) -> tuple[str, str]:
     path, method = event.get("path", ""), event.get("httpMethod", "")
@@ -62,7 +67,8 @@ def publish_sns_message(message: dict) -> None:
     try:
         topic_arn = get_env_var("SNS_TOPIC_ARN")
         logger.debug("TOPIC ARN: %s", topic_arn)
-        topic_response = sns_client.publish_message(topic_arn, json.dumps(message))
+        attributes = {**(trace_attributes() or {}), **(shard_attributes(message.get("sensor_id")) or {})}
+        topic_response = sns_client.publish_message(topic_arn, json.dumps(message), attributes=attributes or None)
         logger.debug("TOPIC RESPONSE: %s", topic_response)
         return topic_response
     except Exception as e:
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+import time
+from urllib.parse import unquote
+from helpers.logs import get_logger
+from helpers.config import InternalServerError
+from helpers.readings_store import readings_store
+from helpers.metrics import metrics, CACHE_HITS, CACHE_MISSES
+from ingress_helpers import InvalidRequestError, UnsupportedEndpointError, build_response
+
+logger = get_logger(__name__)
+
+READ_CACHE_TTL_SECONDS = float(os.getenv("READ_CACHE_TTL_SECONDS", default="5"))
+READ_CACHE_MAX_ENTRIES = int(os.getenv("READ_CACHE_MAX_ENTRIES", default="10000"))
+READ_MAX_SENSOR_IDS = int(os.getenv("READ_MAX_SENSOR_IDS", default="100"))
+READ_MAX_WINDOW_SECONDS = int(os.getenv("READ_MAX_WINDOW_SECONDS", default="86400"))
+DEFAULT_WINDOW = "5m"
+
+LATEST = "latest"
+STATS = "stats"
+# /{sensor_id}/latest, /{sensor_id}/stats, /latest?sensor_ids=..., /stats?sensor_ids=...
+READ_PATH_PATTERN = re.compile(r"^/(?:(?P<sensor_id>[^/]+)/)?(?P<resource>latest|stats)$")
+WINDOW_PATTERN = re.compile(r"^(?P<amount>\d+)(?P<unit>[smh])$")
+WINDOW_UNITS = {"s": 1, "m": 60, "h": 3600}
+
+_cache: dict[tuple, tuple[float, dict | None]] = {}
+
+def _cache_get(key: tuple) -> tuple[bool, dict | None]:
+    entry = _cache.get(key)
+    if entry is None or entry[0] < time.monotonic():
+        metrics.count(CACHE_MISSES)
+        return False, None
+    metrics.count(CACHE_HITS)
+    return True, entry[1]
+
+def _cache_put(key: tuple, value: dict | None) -> None:
+    if len(_cache) >= READ_CACHE_MAX_ENTRIES:
+        now = time.monotonic()
+        for expired_key in [k for k, (expires_at, _) in _cache.items() if expires_at < now]:
+            del _cache[expired_key]
+        while len(_cache) >= READ_CACHE_MAX_ENTRIES:
+            del _cache[next(iter(_cache))]
+    _cache[key] = (time.monotonic() + READ_CACHE_TTL_SECONDS, value)
+
+def get_query_parameter(event: dict, name: str) -> str | None:
+    multi_values: dict = event.get("multiValueQueryStringParameters") or {}
+    if multi_values.get(name):
+        return unquote(multi_values[name][-1])
+    values: dict = event.get("queryStringParameters") or {}
+    value = values.get(name)
+    return unquote(value) if value is not None else None
+
+def get_header(event: dict, name: str) -> str | None:
+    headers: dict = event.get("headers") or {}
+    return headers.get(name) or headers.get(name.lower())
+
+def parse_window(window: str) -> int:
+    match = WINDOW_PATTERN.match(window)
+    if not match:
+        raise InvalidRequestError(f"Invalid window: {window}")
+    seconds = int(match["amount"]) * WINDOW_UNITS[match["unit"]]
+    if not 0 < seconds <= READ_MAX_WINDOW_SECONDS:
+        raise InvalidRequestError(f"Window must be between 1s and {READ_MAX_WINDOW_SECONDS}s")
+    return seconds
+
+def parse_sensor_ids(value: str | None) -> list[str]:
+    sensor_ids = list(dict.fromkeys(sensor_id.strip() for sensor_id in (value or "").split(",") if sensor_id.strip()))
+    if not sensor_ids:
+        raise InvalidRequestError("sensor_ids is required")
+    if len(sensor_ids) > READ_MAX_SENSOR_IDS:
+        raise InvalidRequestError(f"At most {READ_MAX_SENSOR_IDS} sensor_ids are allowed")
+    return sensor_ids
+
+def get_latest(sensor_ids: list[str]) -> dict[str, dict | None]:
+    result: dict[str, dict | None] = {}
+    missing = []
+    for sensor_id in sensor_ids:
+        found, value = _cache_get((LATEST, sensor_id))
+        if found:
+            result[sensor_id] = value
+        else:
+            missing.append(sensor_id)
+    if missing:
+        latest = readings_store.get_latest_readings(missing)
+        for sensor_id in missing:
+            reading = latest.get(sensor_id)
+            value = {"timestamp": reading[0] / 1000, "value": reading[1]} if reading else None
+            _cache_put((LATEST, sensor_id), value)
+            result[sensor_id] = value
+    return result
+
+def compute_stats(readings: list[tuple[int, float | int]], window_seconds: int) -> dict | None:
+    if not readings:
+        return None
+    values = [value for _, value in readings]
+    return {
+        "window_seconds": window_seconds,
+        "count": len(values),
+        "min": min(values),
+        "max": max(values),
+        "mean": sum(values) / len(values),
+        "last": values[-1],
+        "last_timestamp": readings[-1][0] / 1000,
+    }
+
+def get_stats(sensor_ids: list[str], window_seconds: int) -> dict[str, dict | None]:
+    result: dict[str, dict | None] = {}
+    now = time.time()
+    for sensor_id in sensor_ids:
+        found, value = _cache_get((STATS, sensor_id, window_seconds))
+        if not found:
+            value = compute_stats(readings_store.get_readings(sensor_id, now - window_seconds, now), window_seconds)
+            _cache_put((STATS, sensor_id, window_seconds), value)
+        result[sensor_id] = value
+    return result
+
+def build_json_response(event: dict, status_code: int, body: dict) -> dict:
+    """Builds a JSON response with an ETag, or 304 if the client already has the same representation."""
+    payload = json.dumps(body, separators=(",", ":"), sort_keys=True)
+    etag = f'"{hashlib.sha1(payload.encode("utf-8")).hexdigest()}"'
+    headers = {
+        "Content-Type": "application/json",
+        "ETag": etag,
+        "Cache-Control": f"max-age={int(READ_CACHE_TTL_SECONDS)}",
+    }
+    if_none_match = get_header(event, "if-none-match") or ""
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return {"statusCode": 304, "headers": headers, "body": ""}
+    return {"statusCode": status_code, "headers": headers, "body": payload}
+
+def handle_read_request(event: dict, sub_path: str) -> dict:
+    """Serves GET requests below the sensors path from the readings store through the in-process cache."""
+    match = READ_PATH_PATTERN.match(sub_path)
+    if not match:
+        raise UnsupportedEndpointError("Invalid path or method")
+    single_sensor_id = unquote(match["sensor_id"]) if match["sensor_id"] else None
+    sensor_ids = [single_sensor_id] if single_sensor_id else parse_sensor_ids(get_query_parameter(event, "sensor_ids"))
+
+    window_seconds = parse_window(get_query_parameter(event, "window") or DEFAULT_WINDOW) if match["resource"] == STATS else 0
+    try:
+        if match["resource"] == LATEST:
+            result = get_latest(sensor_ids)
+        else:
+            result = get_stats(sensor_ids, window_seconds)
+    except Exception as e:
+        logger.error("Error reading sensor data: %s", e)
+        raise InternalServerError(f"Error reading sensor data: {e}")
+
+    if single_sensor_id:
+        if result[single_sensor_id] is None:
+            return build_response(404, "Not Found")
+        return build_json_response(event, 200, {"sensor_id": single_sensor_id, **result[single_sensor_id]})
+    return build_json_response(event, 200, {"sensors": result})
@@ -1,17 +1,27 @@
 from helpers.logs import get_logger
 from helpers.config import  ConfigurationError, InternalServerError
+from helpers.metrics import metrics, log_metrics, RECORDS_IN, RECORDS_FAILED, AUTH_LATENCY
+from helpers.tracing import span, traced, set_trace_id, trace_id_from_event
+from helpers.capture import capture_events
+from helpers.warmup import run_warmup
 from cognito_auth import AuthError, authenticate_user
 from ingress_helpers import (
     InvalidRequestError, UnsupportedEndpointError,
     build_response, build_sns_message, publish_sns_message, validate_path_and_method, get_request_body, get_path_and_method
 )
+from read_api import handle_read_request
+from admission import RateLimitedError, check_admission, get_retry_after_header
 
 APP_PATH = "/api/v1/sensors"
 HEALTH_PATH = "/health"
 
 logger = get_logger(__name__)
 
+@log_metrics("sensors-ingress")
+@capture_events("ingress")
+@traced
 def lambda_handler(event, context):
+    is_write_request = False
     try:
         logger.debug("EVENT: %s", event)
         response = build_response(200, "Accepted")
@@ -19,18 +29,38 @@ def lambda_handler(event, context):
         if path == HEALTH_PATH:
             return build_response(200, "Healthy")
 
+        if method == "GET" and path.startswith(f"{APP_PATH}/"):
+            with span("auth", AUTH_LATENCY):
+                claims = authenticate_user(event)
+            with span("admission"):
+                check_admission(event, claims, check_sensor=False)
+            with span("read"):
+                return handle_read_request(event, path[len(APP_PATH):])
+
         validate_path_and_method(path, method, APP_PATH, ["POST"])
-        authenticate_user(event)
-        
-        request_body = get_request_body(event)
-        sns_message = build_sns_message(request_body)
-        publish_sns_message(sns_message)
+        is_write_request = True
+        metrics.count(RECORDS_IN)
+        set_trace_id(trace_id_from_event(event))
+        with span("auth", AUTH_LATENCY):
+            claims = authenticate_user(event)
+        # shed over-limit requests before parsing and publishing
+        with span("admission"):
+            check_admission(event, claims)
+
+        with span("parse"):
+            request_body = get_request_body(event)
+            sns_message = build_sns_message(request_body)
+        with span("publish"):
+            publish_sns_message(sns_message)
     except UnsupportedEndpointError as e:
         logger.error("Path and method error: %s", e)
         response = build_response(404, "Not Found")
     except InvalidRequestError as e:
         logger.error("Invalid request: %s", e)
         response = build_response(400, "Bad Request")
+    except RateLimitedError as e:
+        logger.warning("Request rejected: %s", e)
+        response = build_response(429, "Too Many Requests", get_retry_after_header(e))
     except AuthError as e:
         logger.error("Authentication error: %s", e)
         response = build_response(401, "Unauthorized")
@@ -41,5 +71,9 @@ def lambda_handler(event, context):
         logger.error("Error parsing request body: %s", e)
         response = build_response(400, "Bad Request")
 
+    if is_write_request and response["statusCode"] >= 400:
+        metrics.count(RECORDS_FAILED)
     logger.debug("RESPONSE: %s", response)
-    return response
\ No newline at end of file
+    return response
+
+run_warmup("sns_client", "readings_table", "admission_table", "cognito_keys")
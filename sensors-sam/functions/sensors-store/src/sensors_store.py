@@ -0,0 +1,60 @@
+import json
+from helpers.logs import get_logger
+from helpers.readings_store import readings_store
+from helpers.metrics import metrics, log_metrics, RECORDS_IN, RECORDS_FAILED
+from helpers.tracing import span, traced
+from helpers.capture import capture_events
+
+logger = get_logger("sensors-store")
+
+def get_reading(record: dict) -> dict:
+    sensor_data = json.loads(record.get("body") or "")
+    sensor_id, sensor_value = sensor_data.get("sensor_id"), sensor_data.get("value")
+    if sensor_id is None or not isinstance(sensor_value, (int, float)):
+        raise ValueError(f"Incorrect sensor data in package: {sensor_data.get('package_id')}")
+    timestamp = sensor_data.get("timestamp")
+    if not isinstance(timestamp, (int, float)):
+        # readings without a device timestamp are stored at the time SNS delivered them to SQS
+        timestamp = int(record.get("attributes", {}).get("SentTimestamp", 0)) / 1000
+    return {"sensor_id": sensor_id, "value": sensor_value, "timestamp": timestamp}
+
+@log_metrics("sensors-store")
+@capture_events("store")
+@traced
+def lambda_handler(event, context) -> dict:
+    """
+    Lambda handler for storing raw sensor readings.
+    Subscribes to sns-sensors-ingress and appends the readings of the batch
+    to the sensor-readings table, one write per sensor and time bucket.
+    """
+    records = event.get("Records", [])
+    metrics.count(RECORDS_IN, len(records))
+    batch_item_failures = []
+    groups: dict[tuple[str, int], list[dict]] = {}
+    group_message_ids: dict[tuple[str, int], list[str]] = {}
+    with span("decode"):
+        for record in records:
+            message_id = record.get("messageId")
+            try:
+                reading = get_reading(record)
+            except Exception as e:
+                # malformed readings can never be stored, so they are dropped rather than retried
+                logger.error("Skipping message %s: %s", message_id, e)
+                metrics.count(RECORDS_FAILED)
+                continue
+            key = readings_store.get_bucket_key(reading)
+            groups.setdefault(key, []).append(reading)
+            group_message_ids.setdefault(key, []).append(message_id)
+
+    with span("write"):
+        for (sensor_id, bucket_start), readings in groups.items():
+            try:
+                readings_store.append_readings(sensor_id, bucket_start, readings)
+            except Exception as e:
+                logger.error("Error storing readings of sensor %s bucket %d: %s", sensor_id, bucket_start, e)
+                failed_ids = group_message_ids[(sensor_id, bucket_start)]
+                batch_item_failures.extend({"itemIdentifier": message_id} for message_id in failed_ids)
+                metrics.count(RECORDS_FAILED, len(failed_ids))
+    logger.info("%d readings stored in %d writes, %d messages failed",
+        sum(len(readings) for readings in groups.values()), len(groups), len(batch_item_failures))
+    return {"batchItemFailures": batch_item_failures}
@@ -5,9 +5,21 @@ from .dynamo_db import (
     DynamoDBTableClient, 
     parameters_table_client,
     get_sensor_parameters, 
-    get_all_sensor_parameters
+    get_all_sensor_parameters,
+    batch_get_items
     )
 from .sns_common import sns_client
+from .metrics import metrics, log_metrics, MetricsBuffer
+from .object_store import ObjectStoreWriter, LocalFileSystemWriter, S3Writer, get_object_store_writer
+from .readings_store import ReadingsStore, pack_readings, unpack_readings
+from .capture import capture_events
+from .dedup import Deduplicator, ClaimInProgressError
+from .concurrency import process_grouped
+from .sharding import get_shard, shard_attributes, check_shard
+from .warmup import register_warmup, run_warmup
+from .online_detector import OnlineDetector, DetectorConfig
+from .limits_snapshot import LimitsSnapshot, get_limits_snapshot, write_snapshot
+from .tracing import span, traced, get_trace_id, set_trace_id
 
 __all__ = [
     "get_logger",
@@ -20,5 +32,34 @@ __all__ = [
     "parameters_table_client",
     "get_sensor_parameters",
     "get_all_sensor_parameters",
-    "sns_client"
+    "batch_get_items",
+    "sns_client",
+    "metrics",
+    "log_metrics",
+    "MetricsBuffer",
+    "span",
+    "traced",
+    "get_trace_id",
+    "set_trace_id",
+    "ObjectStoreWriter",
+    "LocalFileSystemWriter",
+    "S3Writer",
+    "get_object_store_writer",
+    "ReadingsStore",
+    "pack_readings",
+    "unpack_readings",
+    "capture_events",
+    "LimitsSnapshot",
+    "get_limits_snapshot",
+    "write_snapshot",
+    "Deduplicator",
+    "ClaimInProgressError",
+    "process_grouped",
+    "get_shard",
+    "shard_attributes",
+    "check_shard",
+    "register_warmup",
+    "run_warmup",
+    "OnlineDetector",
+    "DetectorConfig"
     ]
\ No newline at end of file
@@ -0,0 +1,103 @@
+import atexit
+import functools
+import gzip
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from helpers.logs import get_logger
+from helpers.object_store import ObjectStoreWriter, create_object_store_writer
+
+logger = get_logger(__name__)
+
+# capture is disabled unless CAPTURE_URI (file:// or s3://) is set
+CAPTURE_URI = os.getenv("CAPTURE_URI", default="")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", default="1.0"))
+CAPTURE_FLUSH_EVENTS = int(os.getenv("CAPTURE_FLUSH_EVENTS", default="100"))
+CAPTURE_FLUSH_SECONDS = float(os.getenv("CAPTURE_FLUSH_SECONDS", default="60"))
+REDACTED_HEADERS = ("authorization", "cookie")
+REDACTED_VALUE = "REDACTED"
+
+def redact_event(event: dict) -> dict:
+    headers = event.get("headers")
+    if not isinstance(headers, dict):
+        return event
+    return {
+        **event,
+        "headers": {
+            name: REDACTED_VALUE if name.lower() in REDACTED_HEADERS else value
+            for name, value in headers.items()
+        },
+    }
+
+class EventCapture:
+    """
+    Buffers the events received by a handler and writes them as gzip NDJSON
+    objects of {"captured_at", "source", "event"} lines.
+    """
+    def __init__(self, source: str, writer: ObjectStoreWriter):
+        self.source = source
+        self.writer = writer
+        self._lock = threading.Lock()
+        self._buffer: list[str] = []
+        self._first_captured_at = 0.0
+
+    def add(self, event: dict) -> None:
+        captured_at = time.time()
+        line = json.dumps({"captured_at": captured_at, "source": self.source, "event": redact_event(event)}, separators=(",", ":"))
+        with self._lock:
+            if not self._buffer:
+                self._first_captured_at = captured_at
+            self._buffer.append(line)
+
+    def should_flush(self) -> bool:
+        with self._lock:
+            return bool(self._buffer) and (
+                len(self._buffer) >= CAPTURE_FLUSH_EVENTS
+                or time.time() - self._first_captured_at >= CAPTURE_FLUSH_SECONDS
+            )
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        partition = time.strftime("dt=%Y-%m-%d/hour=%H", time.gmtime())
+        key = f"captures/{self.source}/{partition}/{uuid.uuid4().hex}.ndjson.gz"
+        data = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+        location = self.writer.put_object(key, data, "application/x-ndjson")
+        logger.debug("%d events captured to %s", len(lines), location)
+
+def flush_quietly(capture: EventCapture) -> None:
+    try:
+        capture.flush()
+    except Exception as e:
+        logger.error("Error writing captured events: %s", e)
+
+def capture_events(source: str):
+    """
+    Decorator for lambda_handler: records the received events for replay when
+    CAPTURE_URI is set. Capture errors never fail the invocation.
+    """
+    def decorator(handler):
+        if not CAPTURE_URI:
+            return handler
+        capture = EventCapture(source, create_object_store_writer(CAPTURE_URI))
+        atexit.register(flush_quietly, capture)
+
+        @functools.wraps(handler)
+        def wrapper(event, context, *args, **kwargs):
+            try:
+                if random.random() < CAPTURE_SAMPLE_RATE:
+                    capture.add(event)
+            except Exception as e:
+                logger.error("Error capturing event: %s", e)
+            try:
+                return handler(event, context, *args, **kwargs)
+            finally:
+                if capture.should_flush():
+                    flush_quietly(capture)
+        return wrapper
+    return decorator
@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+_executors: dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+def get_executor(max_workers: int) -> ThreadPoolExecutor:
+    """Returns a pool per size, kept for the life of the container."""
+    with _executors_lock:
+        if max_workers not in _executors:
+            _executors[max_workers] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="records")
+        return _executors[max_workers]
+
+def process_in_order(items: list[T], process: Callable[[T], None]) -> list[Exception | None]:
+    errors: list[Exception | None] = []
+    for item in items:
+        try:
+            process(item)
+            errors.append(None)
+        except Exception as e:
+            errors.append(e)
+    return errors
+
+def process_grouped(
+        items: list[T],
+        group_key: Callable[[T], Hashable],
+        process: Callable[[T], None],
+        max_workers: int,
+    ) -> list[Exception | None]:
+    """
+    Processes the items of each group sequentially and the groups concurrently
+    on a bounded pool. Returns the error of each item, or None, in input order.
+    """
+    if max_workers <= 1 or len(items) <= 1:
+        return process_in_order(items, process)
+    groups: dict[Hashable, list[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(group_key(item), []).append(index)
+
+    errors: list[Exception | None] = [None] * len(items)
+
+    def process_group(indexes: list[int]) -> None:
+        group_items = [items[index] for index in indexes]
+        for index, error in zip(indexes, process_in_order(group_items, process)):
+            errors[index] = error
+
+    futures = [get_executor(max_workers).submit(process_group, indexes) for indexes in groups.values()]
+    for future in futures:
+        future.result()
+    return errors
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from botocore.exceptions import BotoCoreError, ClientError
+from helpers.logs import get_logger
+from helpers.dynamo_db import get_dynamodb_table
+from helpers.metrics import metrics, DUPLICATES_SKIPPED
+
+logger = get_logger(__name__)
+
+DEDUP_CACHE_SIZE = int(os.getenv("DEDUP_CACHE_SIZE", default="100000")) # package ids kept per container
+DEDUP_TABLE_NAME = os.getenv("DEDUP_TABLE_NAME", default="") # shared store, disabled if empty
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", default="3600"))
+DEDUP_CLAIM_SECONDS = int(os.getenv("DEDUP_CLAIM_SECONDS", default="120")) # should exceed the visibility timeout
+CONDITIONAL_CHECK_FAILED = "ConditionalCheckFailedException"
+STATE_CLAIMED = "claimed"
+STATE_COMPLETED = "completed"
+
+class ClaimInProgressError(Exception):
+    """The package is claimed by another delivery that may still release it, so this one must be retried."""
+    def __init__(self, package_id: str):
+        super().__init__(f"Package {package_id} is in progress elsewhere")
+        self.package_id = package_id
+
+class Deduplicator:
+    """
+    Suppresses repeated package ids per consumer scope: a bounded LRU of completed
+    ids per container plus an optional DynamoDB table shared by all containers.
+    claim() before the work, then complete() on success or release() on failure
+    so the redelivered message is processed again. A claim that is neither
+    completed nor released expires after DEDUP_CLAIM_SECONDS. Without a table
+    and with an empty LRU every call is a no-op.
+    """
+    def __init__(
+            self,
+            scope: str,
+            max_entries: int = DEDUP_CACHE_SIZE,
+            table_name: str = DEDUP_TABLE_NAME,
+            ttl_seconds: int = DEDUP_TTL_SECONDS,
+            claim_seconds: int = DEDUP_CLAIM_SECONDS,
+        ):
+        self.scope = scope
+        self.max_entries = max_entries
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.claim_seconds = claim_seconds
+        self._lock = threading.Lock()
+        self._completed: OrderedDict[str, None] = OrderedDict()
+        self._claimed: set[str] = set()
+        self.enabled = max_entries > 0 or bool(table_name)
+
+    def _store_key(self, package_id: str) -> str:
+        return f"{self.scope}#{package_id}"
+
+    def _claim_shared(self, package_id: str) -> str | None:
+        """Returns None if the claim is ours, else the state of the claim already stored."""
+        now = int(time.time())
+        try:
+            get_dynamodb_table(self.table_name).put_item(
+                Item={"dedup_key": self._store_key(package_id), "claim_state": STATE_CLAIMED, "expires_at": now + self.claim_seconds},
+                ConditionExpression="attribute_not_exists(dedup_key) OR expires_at < :now",
+                ExpressionAttributeValues={":now": now},
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return None
+        except (BotoCoreError, ClientError) as e:
+            if isinstance(e, ClientError) and e.response.get("Error", {}).get("Code") == CONDITIONAL_CHECK_FAILED:
+                # the item of a failed condition comes back in the low-level format
+                return e.response.get("Item", {}).get("claim_state", {}).get("S", STATE_CLAIMED)
+            # a missing duplicate check is cheaper than a lost message
+            logger.error("Error claiming package %s, processing it anyway: %s", package_id, e)
+            return None
+
+    def _remember(self, package_id: str) -> None:
+        self._completed[package_id] = None
+        self._completed.move_to_end(package_id)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+
+    def claim(self, package_id: str | None) -> bool:
+        """
+        Returns True if the package should be processed, False for a completed
+        duplicate. Raises ClaimInProgressError for a package claimed but not
+        completed, whose message must not be acknowledged.
+        """
+        if not package_id or not self.enabled:
+            return True
+        with self._lock:
+            duplicate = package_id in self._completed
+            if not duplicate:
+                if package_id in self._claimed:
+                    raise ClaimInProgressError(package_id)
+                self._claimed.add(package_id)
+        if not duplicate and self.table_name:
+            state = self._claim_shared(package_id)
+            if state is not None:
+                with self._lock:
+                    self._claimed.discard(package_id)
+                    if state != STATE_COMPLETED:
+                        # the holder may still release it, and then this delivery is the only copy left
+                        raise ClaimInProgressError(package_id)
+                    self._remember(package_id)
+                duplicate = True
+        if duplicate:
+            metrics.count(DUPLICATES_SKIPPED)
+            logger.debug("Duplicate package %s skipped by %s", package_id, self.scope)
+        return not duplicate
+
+    def complete(self, package_id: str | None) -> None:
+        self.complete_many([package_id])
+
+    def release(self, package_id: str | None) -> None:
+        self.release_many([package_id])
+
+    def complete_many(self, package_ids: list[str | None]) -> None:
+        if not self.enabled:
+            return
+        package_ids = [package_id for package_id in package_ids if package_id]
+        with self._lock:
+            for package_id in package_ids:
+                self._claimed.discard(package_id)
+                self._remember(package_id)
+        if self.table_name and package_ids:
+            expires_at = int(time.time()) + self.ttl_seconds
+            try:
+                with get_dynamodb_table(self.table_name).batch_writer() as batch:
+                    for package_id in package_ids:
+                        batch.put_item(Item={"dedup_key": self._store_key(package_id), "claim_state": STATE_COMPLETED, "expires_at": expires_at})
+            except (BotoCoreError, ClientError) as e:
+                logger.error("Error completing %d packages: %s", len(package_ids), e)
+
+    def release_many(self, package_ids: list[str | None]) -> None:
+        if not self.enabled:
+            return
+        package_ids = [package_id for package_id in package_ids if package_id]
+        with self._lock:
+            self._claimed.difference_update(package_ids)
+        if self.table_name and package_ids:
+            try:
+                with get_dynamodb_table(self.table_name).batch_writer() as batch:
+                    for package_id in package_ids:
+                        batch.delete_item(Key={"dedup_key": self._store_key(package_id)})
+            except (BotoCoreError, ClientError) as e:
+                logger.error("Error releasing %d packages: %s", len(package_ids), e)
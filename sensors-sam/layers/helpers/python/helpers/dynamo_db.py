@@ -1,5 +1,8 @@
 from typing import Optional
+import time
 import boto3
+from helpers.metrics import metrics, DYNAMODB_LOOKUPS
+from helpers.warmup import register_warmup
 
 _dynamodb_resource = None
 
@@ -17,6 +20,26 @@ def get_dynamodb_table(table_name: str):
         _dynamodb_tables[table_name] = _get_dynamodb_resource().Table(table_name)
     return _dynamodb_tables[table_name]
 
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+
+def batch_get_items(table_name: str, keys: list[dict]) -> list[dict]:
+    """Gets many items of one table with BatchGetItem, retrying unprocessed keys."""
+    items: list[dict] = []
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request_items = {table_name: {"Keys": keys[start:start + BATCH_GET_MAX_KEYS]}}
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            metrics.count(DYNAMODB_LOOKUPS)
+            response = _get_dynamodb_resource().batch_get_item(RequestItems=request_items)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                break
+            time.sleep(0.05 * 2 ** attempt)
+        if request_items:
+            raise RuntimeError(f"Unprocessed keys left after {BATCH_GET_MAX_ATTEMPTS} attempts in table {table_name}")
+    return items
+
 class DynamoDBTableClient:
     def __init__(self, table_name: str):
         self.table = None
@@ -28,6 +51,7 @@ class DynamoDBTableClient:
         return self.table
     
     def get_item(self, sensor_id: str) -> Optional[dict]:
+        metrics.count(DYNAMODB_LOOKUPS)
         response = self.get_table().get_item(Key={"sensor_id": sensor_id})
         return response.get("Item")
 
@@ -41,6 +65,7 @@ class DynamoDBTableClient:
 
 
 parameters_table_client = DynamoDBTableClient(table_name="sensor-parameters")
+register_warmup("dynamodb", parameters_table_client.get_table)
 
 def get_sensor_parameters(sensor_id: str) -> Optional[dict]:
     return parameters_table_client.get_item(sensor_id)
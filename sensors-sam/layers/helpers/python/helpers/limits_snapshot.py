@@ -0,0 +1,136 @@
+import bisect
+import mmap
+import os
+import struct
+import time
+from helpers.logs import get_logger
+
+logger = get_logger(__name__)
+
+# the export tool writes here by default, so the snapshot ships inside the layer
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sensor_limits.snap")
+LIMITS_SNAPSHOT_PATH = os.getenv("LIMITS_SNAPSHOT_PATH", default=DEFAULT_SNAPSHOT_PATH)
+LIMITS_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("LIMITS_SNAPSHOT_MAX_AGE_SECONDS", default="0")) # 0: no limit
+
+# header: magic, format version, id width, count, reserved, version stamp (ms since epoch)
+# followed by count sorted NUL-padded ids, then count int32 min values and count int32 max values
+MAGIC = b"SNSLIMIT"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHHIIQ")
+HEADER_SIZE = 32
+INT32 = struct.Struct("<i")
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+class SnapshotFormatError(Exception):
+    pass
+
+def encode_snapshot(limits: dict[str, tuple[int, int]], version: int | None = None) -> bytes:
+    """Builds a snapshot of sensor_id -> (min_value, max_value); version defaults to the current time in ms."""
+    keys = sorted(sensor_id.encode("utf-8") for sensor_id in limits)
+    id_width = max((len(key) for key in keys), default=1)
+    ids = bytearray()
+    min_values, max_values = [], []
+    for key in keys:
+        if b"\0" in key:
+            raise ValueError(f"Invalid sensor id: {key!r}")
+        ids += key.ljust(id_width, b"\0")
+        min_value, max_value = limits[key.decode("utf-8")]
+        if not (INT32_MIN <= min_value <= INT32_MAX and INT32_MIN <= max_value <= INT32_MAX):
+            raise ValueError(f"Limits of sensor {key.decode('utf-8')} do not fit int32")
+        min_values.append(min_value)
+        max_values.append(max_value)
+    # keep the int32 arrays 4-byte aligned
+    ids += b"\0" * (-len(ids) % 4)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, id_width, len(keys), 0, int(time.time() * 1000) if version is None else version)
+    return b"".join((
+        header.ljust(HEADER_SIZE, b"\0"),
+        bytes(ids),
+        struct.pack(f"<{len(keys)}i", *min_values),
+        struct.pack(f"<{len(keys)}i", *max_values),
+    ))
+
+def write_snapshot(path: str, limits: dict[str, tuple[int, int]], version: int | None = None) -> int:
+    data = encode_snapshot(limits, version)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+class _SnapshotIds:
+    """Sequence view over the fixed-width ids for bisect, reading straight from the buffer."""
+    def __init__(self, buffer, offset: int, width: int, count: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.width = width
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        start = self.offset + index * self.width
+        return self.buffer[start:start + self.width]
+
+class LimitsSnapshot:
+    """Memory-mapped limits snapshot; lookups binary-search the mapped ids without parsing the file."""
+    def __init__(self, buffer):
+        if len(buffer) < HEADER_SIZE:
+            raise SnapshotFormatError("Snapshot is shorter than its header")
+        magic, format_version, id_width, count, _, version = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise SnapshotFormatError(f"Unsupported snapshot format: {magic!r} v{format_version}")
+        ids_size = id_width * count + (-(id_width * count) % 4)
+        self.min_offset = HEADER_SIZE + ids_size
+        self.max_offset = self.min_offset + 4 * count
+        if len(buffer) != self.max_offset + 4 * count:
+            raise SnapshotFormatError("Snapshot size does not match its header")
+        self.buffer = buffer
+        self.id_width = id_width
+        self.version = version
+        self.ids = _SnapshotIds(buffer, HEADER_SIZE, id_width, count)
+
+    @classmethod
+    def open(cls, path: str) -> "LimitsSnapshot":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def age_seconds(self) -> float:
+        return time.time() - self.version / 1000
+
+    def get(self, sensor_id: str) -> tuple[int, int] | None:
+        key = str(sensor_id).encode("utf-8")
+        if len(key) > self.id_width:
+            return None
+        key = key.ljust(self.id_width, b"\0")
+        index = bisect.bisect_left(self.ids, key)
+        if index == len(self.ids) or self.ids[index] != key:
+            return None
+        return (
+            INT32.unpack_from(self.buffer, self.min_offset + 4 * index)[0],
+            INT32.unpack_from(self.buffer, self.max_offset + 4 * index)[0],
+        )
+
+_limits_snapshot: LimitsSnapshot | None = None
+_limits_snapshot_loaded = False
+
+def get_limits_snapshot() -> LimitsSnapshot | None:
+    """Returns the snapshot at LIMITS_SNAPSHOT_PATH, or None if it is missing, invalid or too old."""
+    global _limits_snapshot, _limits_snapshot_loaded
+    if not _limits_snapshot_loaded:
+        _limits_snapshot_loaded = True
+        if os.path.exists(LIMITS_SNAPSHOT_PATH):
+            try:
+                snapshot = LimitsSnapshot.open(LIMITS_SNAPSHOT_PATH)
+                if LIMITS_SNAPSHOT_MAX_AGE_SECONDS and snapshot.age_seconds() > LIMITS_SNAPSHOT_MAX_AGE_SECONDS:
+                    logger.warning("Limits snapshot version %d is too old, ignoring it", snapshot.version)
+                else:
+                    _limits_snapshot = snapshot
+                    logger.info("Limits snapshot version %d of %d sensors loaded", snapshot.version, len(snapshot))
+            except (OSError, ValueError, SnapshotFormatError) as e:
+                logger.error("Error loading limits snapshot %s: %s", LIMITS_SNAPSHOT_PATH, e)
+    return _limits_snapshot
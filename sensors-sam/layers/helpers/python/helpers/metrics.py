@@ -0,0 +1,152 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import ContextDecorator
+from helpers.logs import get_logger
+
+logger = get_logger(__name__)
+
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", default="SensorsStream")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", default="true").lower() == "true"
+MAX_VALUES_PER_METRIC = 100 # EMF limit for the number of values of one metric in one record
+
+UNIT_COUNT = "Count"
+UNIT_MILLISECONDS = "Milliseconds"
+UNIT_PERCENT = "Percent"
+
+# Metric names shared by all functions
+RECORDS_IN = "RecordsIn"
+RECORDS_FAILED = "RecordsFailed"
+ANOMALIES_LOW = "AnomaliesLow"
+ANOMALIES_HIGH = "AnomaliesHigh"
+ANOMALIES_DRIFT = "AnomaliesDrift"
+ANOMALIES_STUCK = "AnomaliesStuck"
+ANOMALIES_RATE = "AnomaliesRate"
+PUBLISH_LATENCY = "PublishLatency"
+DYNAMODB_LOOKUPS = "DynamoDBLookups"
+CACHE_HITS = "CacheHits"
+CACHE_MISSES = "CacheMisses"
+SNAPSHOT_HITS = "LimitsSnapshotHits"
+DUPLICATES_SKIPPED = "DuplicatesSkipped"
+REQUESTS_THROTTLED = "RequestsThrottled"
+SHARD_MISROUTED = "ShardMisrouted"
+CACHE_HIT_RATIO = "CacheHitRatio"
+AUTH_LATENCY = "AuthLatency"
+BATCH_SIZE = "BatchSize"
+HANDLER_LATENCY = "HandlerLatency"
+
+class MetricsBuffer:
+    """
+    Buffers counters and timings of one invocation and flushes them
+    as a single CloudWatch Embedded Metric Format record.
+    """
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self.service = "unknown"
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._values: dict[str, list[float]] = {}
+        self._units: dict[str, str] = {}
+
+    def reset(self, service: str | None = None) -> None:
+        with self._lock:
+            if service:
+                self.service = service
+            self._counters.clear()
+            self._values.clear()
+            self._units.clear()
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            self._units[name] = UNIT_COUNT
+
+    def put_value(self, name: str, value: float, unit: str = UNIT_COUNT) -> None:
+        with self._lock:
+            values = self._values.setdefault(name, [])
+            if len(values) < MAX_VALUES_PER_METRIC:
+                values.append(value)
+            self._units[name] = unit
+
+    def timing(self, name: str, elapsed_ms: float) -> None:
+        self.put_value(name, round(elapsed_ms, 3), UNIT_MILLISECONDS)
+
+    def timer(self, name: str) -> "Timer":
+        return Timer(self, name)
+
+    def build_record(self) -> dict | None:
+        with self._lock:
+            metrics: dict[str, float | list[float]] = {**self._counters, **self._values}
+            units = dict(self._units)
+        hits, misses = metrics.get(CACHE_HITS, 0), metrics.get(CACHE_MISSES, 0)
+        if isinstance(hits, (int, float)) and isinstance(misses, (int, float)) and hits + misses > 0:
+            metrics[CACHE_HIT_RATIO] = round(100.0 * hits / (hits + misses), 2)
+            units[CACHE_HIT_RATIO] = UNIT_PERCENT
+        if not metrics:
+            return None
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [["Service"]],
+                        "Metrics": [{"Name": name, "Unit": units[name]} for name in metrics],
+                    }
+                ],
+            },
+            "Service": self.service,
+            **metrics,
+        }
+
+    def flush(self) -> None:
+        record = self.build_record()
+        self.reset()
+        if record is None or not METRICS_ENABLED:
+            return
+        # EMF records must be written to stdout as bare JSON lines, outside the log format
+        sys.stdout.write(json.dumps(record, separators=(",", ":")) + "\n")
+        sys.stdout.flush()
+
+class Timer(ContextDecorator):
+    """Records the elapsed time of a block or a function call as a timing metric."""
+    def __init__(self, buffer: MetricsBuffer, name: str):
+        self.buffer = buffer
+        self.name = name
+        self._local = threading.local()
+
+    def __enter__(self) -> "Timer":
+        self._local.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.buffer.timing(self.name, (time.perf_counter() - self._local.start) * 1000)
+        return False
+
+metrics = MetricsBuffer()
+
+def log_metrics(service: str):
+    """
+    Decorator for lambda_handler: resets the buffer before the invocation,
+    records batch size and handler latency and flushes one EMF record afterwards.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context, *args, **kwargs):
+            metrics.reset(service)
+            if isinstance(event, dict) and "Records" in event:
+                metrics.put_value(BATCH_SIZE, len(event.get("Records") or []))
+            start = time.perf_counter()
+            try:
+                return handler(event, context, *args, **kwargs)
+            finally:
+                metrics.timing(HANDLER_LATENCY, (time.perf_counter() - start) * 1000)
+                try:
+                    metrics.flush()
+                except Exception as e:
+                    logger.error("Error flushing metrics: %s", e)
+        return wrapper
+    return decorator
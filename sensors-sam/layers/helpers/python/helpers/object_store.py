@@ -0,0 +1,90 @@
+import os
+from abc import ABC, abstractmethod
+import boto3
+from botocore.exceptions import ClientError
+from helpers.logs import get_logger
+from helpers.config import get_env_var, ConfigurationError, InternalServerError
+
+logger = get_logger(__name__)
+
+FILE_SCHEME = "file://"
+S3_SCHEME = "s3://"
+
+class ObjectStoreWriter(ABC):
+    """Writes immutable objects under a key prefix."""
+    @abstractmethod
+    def put_object(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        """Returns the URI of the written object."""
+
+    @abstractmethod
+    def get_object(self, key: str) -> bytes | None:
+        """Returns the object, or None if there is none under the key."""
+
+class LocalFileSystemWriter(ObjectStoreWriter):
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def put_object(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        path = os.path.join(self.root_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        logger.debug("Object written to %s", path)
+        return f"{FILE_SCHEME}{path}"
+
+    def get_object(self, key: str) -> bytes | None:
+        try:
+            with open(os.path.join(self.root_dir, key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+class S3Writer(ObjectStoreWriter):
+    def __init__(self, bucket: str, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.client = None
+
+    def get_client(self):
+        if self.client is None:
+            self.client = boto3.client("s3")
+        return self.client
+
+    def put_object(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        full_key = f"{self.prefix}/{key}" if self.prefix else key
+        try:
+            self.get_client().put_object(Bucket=self.bucket, Key=full_key, Body=data, ContentType=content_type)
+        except ClientError as e:
+            logger.error("Error writing object to S3: %s", e)
+            raise InternalServerError(f"Error writing object to S3: {e}")
+        logger.debug("Object written to s3://%s/%s", self.bucket, full_key)
+        return f"{S3_SCHEME}{self.bucket}/{full_key}"
+
+    def get_object(self, key: str) -> bytes | None:
+        full_key = f"{self.prefix}/{key}" if self.prefix else key
+        try:
+            return self.get_client().get_object(Bucket=self.bucket, Key=full_key)["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            logger.error("Error reading object from S3: %s", e)
+            raise InternalServerError(f"Error reading object from S3: {e}")
+
+def create_object_store_writer(uri: str) -> ObjectStoreWriter:
+    """Creates a writer for a file:// or s3:// URI."""
+    if uri.startswith(FILE_SCHEME):
+        return LocalFileSystemWriter(uri[len(FILE_SCHEME):])
+    if uri.startswith(S3_SCHEME):
+        bucket, _, prefix = uri[len(S3_SCHEME):].partition("/")
+        return S3Writer(bucket, prefix)
+    raise ConfigurationError(f"Unsupported object store URI: {uri}")
+
+_writers: dict[str, ObjectStoreWriter] = {}
+
+def get_object_store_writer(env_var: str) -> ObjectStoreWriter:
+    uri = get_env_var(env_var)
+    if uri not in _writers:
+        _writers[uri] = create_object_store_writer(uri)
+    return _writers[uri]
@@ -0,0 +1,235 @@
+import math
+import os
+import struct
+import threading
+import time
+from array import array
+from helpers.logs import get_logger
+from helpers.object_store import get_object_store_writer
+from helpers.sharding import SHARD_INDEX
+
+logger = get_logger(__name__)
+
+DETECTOR_ENABLED = os.getenv("DETECTOR_ENABLED", default="false").lower() == "true"
+DETECTOR_ALPHA = float(os.getenv("DETECTOR_ALPHA", default="0.05")) # EWMA weight of the newest reading
+DETECTOR_Z_THRESHOLD = float(os.getenv("DETECTOR_Z_THRESHOLD", default="4"))
+DETECTOR_STUCK_READINGS = int(os.getenv("DETECTOR_STUCK_READINGS", default="30")) # identical readings in a row
+DETECTOR_MIN_READINGS = int(os.getenv("DETECTOR_MIN_READINGS", default="10")) # before z-scores are trusted
+DETECTOR_STATE_URI_ENV = "DETECTOR_STATE_URI" # file:// or s3:// prefix of the checkpoints, empty disables them
+DETECTOR_CHECKPOINT_SECONDS = float(os.getenv("DETECTOR_CHECKPOINT_SECONDS", default="300"))
+
+ALERT_TYPE_DRIFT = "drift"
+ALERT_TYPE_STUCK = "stuck"
+ALERT_TYPE_RATE = "rate"
+DETECTOR_TYPES = (ALERT_TYPE_DRIFT, ALERT_TYPE_STUCK, ALERT_TYPE_RATE)
+
+# checkpoint: magic, format version, reserved, count, saved at (ms since epoch),
+# then float64 mean, variance, last value and last timestamp arrays, int32 reading
+# count and stuck count arrays, then the sensor ids joined by newlines
+MAGIC = b"SNSDETEC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHHIQ")
+
+class DetectorConfig:
+    """Per-sensor selection from the detectors, ewma_alpha, z_threshold, stuck_readings and max_rate parameters."""
+    def __init__(
+            self,
+            detectors: frozenset[str],
+            alpha: float = DETECTOR_ALPHA,
+            z_threshold: float = DETECTOR_Z_THRESHOLD,
+            stuck_readings: int = DETECTOR_STUCK_READINGS,
+            max_rate: float | None = None,
+        ):
+        if stuck_readings < 2:
+            # a run is counted from the second identical reading
+            raise ValueError(f"stuck_readings must be at least 2, not {stuck_readings}")
+        self.drift = ALERT_TYPE_DRIFT in detectors
+        self.stuck = ALERT_TYPE_STUCK in detectors
+        self.rate = ALERT_TYPE_RATE in detectors and max_rate is not None
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.stuck_readings = stuck_readings
+        self.max_rate = max_rate
+
+    @classmethod
+    def from_params(cls, params: dict) -> "DetectorConfig | None":
+        """None for a sensor without a detectors column or with an invalid one, which keeps only its static limits."""
+        names = params.get("detectors")
+        if not names:
+            return None
+        if isinstance(names, str):
+            names = names.split(",")
+        detectors = frozenset(name.strip() for name in names) & frozenset(DETECTOR_TYPES)
+        if not detectors:
+            return None
+        max_rate = params.get("max_rate")
+        try:
+            return cls(
+                detectors,
+                alpha=float(params.get("ewma_alpha", DETECTOR_ALPHA)),
+                z_threshold=float(params.get("z_threshold", DETECTOR_Z_THRESHOLD)),
+                stuck_readings=int(params.get("stuck_readings", DETECTOR_STUCK_READINGS)),
+                max_rate=None if max_rate is None else float(max_rate),
+            )
+        except (TypeError, ValueError) as e:
+            logger.error("Invalid detector config of sensor %s: %s", params.get("sensor_id"), e)
+            return None
+
+class Detection:
+    def __init__(self, alert_type: str, deviation: float, score: float):
+        self.alert_type = alert_type
+        self.deviation = deviation # signed distance from the expected value
+        self.score = score # z-score, rate per second or identical readings in a row
+
+class SensorState:
+    """The state of one sensor after a scored reading, applied once its alerts are published."""
+    def __init__(self, slot: int, mean: float, variance: float, last_value: float, last_timestamp: float, count: int, stuck: int):
+        self.slot = slot
+        self.mean = mean
+        self.variance = variance
+        self.last_value = last_value
+        self.last_timestamp = last_timestamp
+        self.count = count
+        self.stuck = stuck
+
+class OnlineDetector:
+    """
+    EWMA mean and variance, rate of change and stuck-value counters per sensor,
+    updated in O(1) per reading. The state lives in flat arrays indexed by a
+    slot per sensor so that it stays compact and is checkpointed as is.
+    Readings of one sensor must be updated in order by one thread at a time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slots: dict[str, int] = {}
+        self.sensor_ids: list[str] = []
+        self.mean = array("d")
+        self.variance = array("d")
+        self.last_value = array("d")
+        self.last_timestamp = array("d")
+        self.count = array("i")
+        self.stuck = array("i")
+
+    def __len__(self) -> int:
+        return len(self.sensor_ids)
+
+    def get_slot(self, sensor_id: str) -> int:
+        slot = self.slots.get(sensor_id)
+        if slot is None:
+            with self._lock:
+                slot = self.slots.get(sensor_id)
+                if slot is None:
+                    for values in (self.mean, self.variance, self.last_value, self.last_timestamp):
+                        values.append(0.0)
+                    self.count.append(0)
+                    self.stuck.append(0)
+                    self.sensor_ids.append(sensor_id)
+                    slot = self.slots[sensor_id] = len(self.sensor_ids) - 1
+        return slot
+
+    def score(self, sensor_id: str, value: float, timestamp: float | None, config: DetectorConfig) -> tuple[list[Detection], SensorState]:
+        """
+        Scores the reading against the state before it, without changing it. The
+        returned state is applied after the alerts are published, so that a reading
+        retried after a failure is not added twice.
+        """
+        slot = self.get_slot(sensor_id)
+        count = self.count[slot]
+        timestamp = math.nan if timestamp is None else timestamp
+        if count == 0:
+            return [], SensorState(slot, value, 0.0, value, timestamp, 1, 0)
+
+        detections = []
+        mean, variance, last_value = self.mean[slot], self.variance[slot], self.last_value[slot]
+        diff = value - mean
+        if config.drift and count >= DETECTOR_MIN_READINGS and variance > 0:
+            z = diff / math.sqrt(variance)
+            if abs(z) > config.z_threshold:
+                detections.append(Detection(ALERT_TYPE_DRIFT, diff, z))
+        if config.rate:
+            elapsed = timestamp - self.last_timestamp[slot]
+            if elapsed > 0: # False for missing timestamps (nan)
+                rate = (value - last_value) / elapsed
+                if abs(rate) > config.max_rate:
+                    detections.append(Detection(ALERT_TYPE_RATE, value - last_value, rate))
+        stuck = self.stuck[slot] + 1 if value == last_value else 0
+        # raised once per run of identical readings
+        if config.stuck and stuck + 1 == config.stuck_readings:
+            detections.append(Detection(ALERT_TYPE_STUCK, 0.0, stuck + 1))
+
+        increment = config.alpha * diff
+        return detections, SensorState(
+            slot,
+            mean + increment,
+            (1 - config.alpha) * (variance + diff * increment),
+            value,
+            timestamp,
+            min(count + 1, 2 ** 31 - 1),
+            stuck,
+        )
+
+    def apply(self, state: SensorState) -> None:
+        slot = state.slot
+        self.mean[slot], self.variance[slot] = state.mean, state.variance
+        self.last_value[slot], self.last_timestamp[slot] = state.last_value, state.last_timestamp
+        self.count[slot], self.stuck[slot] = state.count, state.stuck
+
+    def update(self, sensor_id: str, value: float, timestamp: float | None, config: DetectorConfig) -> list[Detection]:
+        """Scores the reading, then adds it to the state."""
+        detections, state = self.score(sensor_id, value, timestamp, config)
+        self.apply(state)
+        return detections
+
+    def to_bytes(self) -> bytes:
+        with self._lock:
+            ids = "\n".join(self.sensor_ids).encode("utf-8")
+            return b"".join((
+                HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(self.sensor_ids), int(time.time() * 1000)),
+                self.mean.tobytes(), self.variance.tobytes(), self.last_value.tobytes(), self.last_timestamp.tobytes(),
+                self.count.tobytes(), self.stuck.tobytes(),
+                ids,
+            ))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "OnlineDetector":
+        magic, format_version, _, count, _ = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported detector checkpoint: {magic!r} v{format_version}")
+        detector = cls()
+        offset = HEADER.size
+        for values in (detector.mean, detector.variance, detector.last_value, detector.last_timestamp, detector.count, detector.stuck):
+            size = count * values.itemsize
+            values.frombytes(data[offset:offset + size])
+            offset += size
+        detector.sensor_ids = data[offset:].decode("utf-8").split("\n") if count else []
+        if len(detector.sensor_ids) != count:
+            raise ValueError("Detector checkpoint ids do not match its header")
+        detector.slots = {sensor_id: slot for slot, sensor_id in enumerate(detector.sensor_ids)}
+        return detector
+
+def get_checkpoint_key(scope: str) -> str:
+    # one key per shard, written by the single container of the shard (see ReservedConcurrentExecutions in template.yaml)
+    return f"detector-state/{scope}-shard-{SHARD_INDEX}.bin"
+
+def load_checkpoint(scope: str) -> OnlineDetector:
+    """The last checkpoint of the scope, or an empty detector if there is none or it cannot be read."""
+    if not os.getenv(DETECTOR_STATE_URI_ENV):
+        return OnlineDetector()
+    try:
+        data = get_object_store_writer(DETECTOR_STATE_URI_ENV).get_object(get_checkpoint_key(scope))
+        if data is None:
+            return OnlineDetector()
+        detector = OnlineDetector.from_bytes(data)
+        logger.info("Detector state of %d sensors restored", len(detector))
+        return detector
+    except Exception as e:
+        logger.error("Error restoring detector state, starting empty: %s", e)
+        return OnlineDetector()
+
+def save_checkpoint(detector: OnlineDetector, scope: str) -> None:
+    if not os.getenv(DETECTOR_STATE_URI_ENV):
+        return
+    try:
+        get_object_store_writer(DETECTOR_STATE_URI_ENV).put_object(get_checkpoint_key(scope), detector.to_bytes())
+    except Exception as e:
+        logger.error("Error saving detector state: %s", e)
@@ -0,0 +1,229 @@
+import os
+import time
+import zlib
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from helpers.logs import get_logger
+from helpers.dynamo_db import get_dynamodb_table, batch_get_items
+from helpers.metrics import metrics
+from helpers.warmup import register_warmup
+
+logger = get_logger(__name__)
+
+READINGS_TABLE_NAME = os.getenv("READINGS_TABLE_NAME", default="sensor-readings")
+READINGS_BUCKET_SECONDS = int(os.getenv("READINGS_BUCKET_SECONDS", default="3600"))
+READINGS_VALUE_SCALE = int(os.getenv("READINGS_VALUE_SCALE", default="1"))
+READINGS_RETENTION_DAYS = int(os.getenv("READINGS_RETENTION_DAYS", default="0"))
+# chunk bytes per item before it rolls over, well below the 400 KB item limit since every append is billed on the whole item
+READINGS_ITEM_MAX_BYTES = int(os.getenv("READINGS_ITEM_MAX_BYTES", default="32768"))
+COMPRESSION_LEVEL = 6
+STORE_WRITES = "ReadingsStoreWrites"
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+def pack_readings(readings: list[tuple[int, int]]) -> bytes:
+    """
+    Packs (timestamp_ms, value) pairs into one compressed chunk:
+    count, then delta-encoded timestamps and zigzag delta-encoded values as varints.
+    """
+    readings = sorted(readings)
+    out = bytearray()
+    _write_varint(out, len(readings))
+    previous_ts, previous_value = 0, 0
+    for timestamp_ms, value in readings:
+        _write_varint(out, timestamp_ms - previous_ts)
+        _write_varint(out, _zigzag(value - previous_value))
+        previous_ts, previous_value = timestamp_ms, value
+    return zlib.compress(bytes(out), COMPRESSION_LEVEL)
+
+def unpack_readings(chunk: bytes) -> list[tuple[int, int]]:
+    data = zlib.decompress(chunk)
+    count, pos = _read_varint(data, 0)
+    readings = []
+    timestamp_ms, value = 0, 0
+    for _ in range(count):
+        delta_ts, pos = _read_varint(data, pos)
+        delta_value, pos = _read_varint(data, pos)
+        timestamp_ms += delta_ts
+        value += _unzigzag(delta_value)
+        readings.append((timestamp_ms, value))
+    return readings
+
+class ReadingsStore:
+    """
+    Stores raw readings packed per (sensor_id, time bucket): every batch appends
+    one compressed chunk to the bucket item, so one write holds many readings.
+    A bucket item holding READINGS_ITEM_MAX_BYTES of chunks rolls over to a
+    segment item under the sort key bucket_start + segment, and the first item
+    records the last segment in last_segment.
+    """
+    def __init__(
+            self,
+            table_name: str = READINGS_TABLE_NAME,
+            bucket_seconds: int = READINGS_BUCKET_SECONDS,
+            value_scale: int = READINGS_VALUE_SCALE,
+            retention_days: int = READINGS_RETENTION_DAYS,
+            item_max_bytes: int = READINGS_ITEM_MAX_BYTES,
+        ):
+        self.table_name = table_name
+        self.bucket_seconds = bucket_seconds
+        self.value_scale = value_scale
+        self.retention_days = retention_days
+        self.item_max_bytes = item_max_bytes
+        self._segments: dict[str, tuple[int, int]] = {} # sensor_id -> (bucket_start, segment last written)
+
+    def get_table(self):
+        return get_dynamodb_table(self.table_name)
+
+    def get_bucket_start(self, timestamp: float) -> int:
+        return int(timestamp) // self.bucket_seconds * self.bucket_seconds
+
+    def encode_value(self, value: float) -> int:
+        return round(value * self.value_scale)
+
+    def decode_value(self, value: int) -> float | int:
+        return value if self.value_scale == 1 else value / self.value_scale
+
+    def get_bucket_key(self, reading: dict) -> tuple[str, int]:
+        """Returns the (sensor_id, bucket_start) key of a reading with sensor_id, value and timestamp (seconds)."""
+        return str(reading["sensor_id"]), self.get_bucket_start(reading["timestamp"])
+
+    def append_readings(self, sensor_id: str, bucket_start: int, readings: list[dict]) -> None:
+        """
+        Appends the readings of one sensor and bucket as one packed chunk to the
+        segment item last written, or to the next one if it has no room left.
+        """
+        packed = [(int(reading["timestamp"] * 1000), self.encode_value(reading["value"])) for reading in readings]
+        chunk = pack_readings(packed)
+        update_expression = (
+            "SET chunks = list_append(if_not_exists(chunks, :empty), :chunk), "
+            "reading_count = if_not_exists(reading_count, :zero) + :count, "
+            "chunk_bytes = if_not_exists(chunk_bytes, :zero) + :chunk_bytes"
+        )
+        values = {
+            ":empty": [],
+            ":chunk": [chunk],
+            ":zero": 0,
+            ":count": len(packed),
+            ":chunk_bytes": len(chunk),
+            # an empty item takes any chunk, so a chunk larger than the limit still gets its own item
+            ":room": self.item_max_bytes - len(chunk),
+        }
+        if self.retention_days > 0:
+            update_expression += ", expires_at = :expires_at"
+            values[":expires_at"] = bucket_start + self.bucket_seconds + self.retention_days * 86400
+        cached_bucket, cached_segment = self._segments.get(sensor_id, (bucket_start, 0))
+        first_segment = segment = cached_segment if cached_bucket == bucket_start else 0
+        while True:
+            if segment >= self.bucket_seconds:
+                raise RuntimeError(f"No segment left in bucket {bucket_start} of sensor {sensor_id}")
+            try:
+                self.get_table().update_item(
+                    Key={"sensor_id": sensor_id, "bucket_start": bucket_start + segment},
+                    UpdateExpression=update_expression,
+                    ConditionExpression="attribute_not_exists(chunk_bytes) OR chunk_bytes <= :room",
+                    ExpressionAttributeValues=values,
+                )
+                break
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+                segment += 1
+        metrics.count(STORE_WRITES)
+        if segment != first_segment:
+            self.set_last_segment(sensor_id, bucket_start, segment)
+        self._segments[sensor_id] = (bucket_start, segment)
+
+    def set_last_segment(self, sensor_id: str, bucket_start: int, segment: int) -> None:
+        """Records a rollover on the first item of the bucket so that latest readings are found in one more lookup."""
+        try:
+            self.get_table().update_item(
+                Key={"sensor_id": sensor_id, "bucket_start": bucket_start},
+                UpdateExpression="SET last_segment = :segment",
+                ConditionExpression="attribute_not_exists(last_segment) OR last_segment < :segment",
+                ExpressionAttributeValues={":segment": segment},
+            )
+        except ClientError as e:
+            # another writer already recorded the same or a later segment
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+
+    def get_bucket_readings(self, item: dict | None) -> list[tuple[int, float | int]]:
+        if not item:
+            return []
+        readings = [reading for chunk in item.get("chunks", []) for reading in unpack_readings(bytes(chunk))]
+        readings.sort()
+        return [(timestamp_ms, self.decode_value(value)) for timestamp_ms, value in readings]
+
+    def get_readings(self, sensor_id: str, start_ts: float, end_ts: float | None = None) -> list[tuple[int, float | int]]:
+        """Returns (timestamp_ms, value) readings of a sensor between start_ts and end_ts (seconds)."""
+        end_ts = end_ts if end_ts is not None else time.time()
+        # the segments of the last bucket sort after its first item
+        query = {
+            "KeyConditionExpression": Key("sensor_id").eq(sensor_id)
+            & Key("bucket_start").between(self.get_bucket_start(start_ts), self.get_bucket_start(end_ts) + self.bucket_seconds - 1),
+        }
+        start_ms, end_ms = int(start_ts * 1000), int(end_ts * 1000)
+        readings = []
+        while True:
+            response = self.get_table().query(**query)
+            for item in response.get("Items", []):
+                readings.extend(reading for reading in self.get_bucket_readings(item) if start_ms <= reading[0] <= end_ms)
+            if "LastEvaluatedKey" not in response:
+                break
+            query["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        # readings arriving late can be in a later segment than newer ones
+        readings.sort()
+        return readings
+
+    def get_latest_readings(self, sensor_ids: list[str], now: float | None = None) -> dict[str, tuple[int, float | int]]:
+        """
+        Returns the latest (timestamp_ms, value) reading of each sensor, looking up the
+        current bucket of all sensors in one batch and the previous bucket for the rest.
+        The last segment of a bucket that rolled over takes one more batch.
+        """
+        bucket_start = self.get_bucket_start(now if now is not None else time.time())
+        latest: dict[str, tuple[int, float | int]] = {}
+        pending = list(dict.fromkeys(sensor_ids))
+        for start in (bucket_start, bucket_start - self.bucket_seconds):
+            if not pending:
+                break
+            items = batch_get_items(
+                self.table_name,
+                [{"sensor_id": sensor_id, "bucket_start": start} for sensor_id in pending],
+            )
+            segment_keys = [
+                {"sensor_id": item["sensor_id"], "bucket_start": start + int(item["last_segment"])}
+                for item in items if item.get("last_segment")
+            ]
+            if segment_keys:
+                items += batch_get_items(self.table_name, segment_keys)
+            for item in items:
+                readings = self.get_bucket_readings(item)
+                if readings and readings[-1] > latest.get(item["sensor_id"], (-1, 0)):
+                    latest[item["sensor_id"]] = readings[-1]
+            pending = [sensor_id for sensor_id in pending if sensor_id not in latest]
+        return latest
+
+readings_store = ReadingsStore()
+register_warmup("readings_table", readings_store.get_table)
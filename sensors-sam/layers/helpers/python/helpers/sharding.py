@@ -0,0 +1,47 @@
+import hashlib
+import os
+from helpers.logs import get_logger
+from helpers.metrics import metrics, SHARD_MISROUTED
+
+logger = get_logger(__name__)
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", default="1")) # 1 disables sharding
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", default="0")) # shard owned by this consumer
+SHARD_ATTRIBUTE = "shard" # SNS message attribute matched by the subscription filter policies
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash: growing from n to n + 1 buckets moves only 1 / (n + 1) of the keys."""
+    bucket, next_bucket = -1, 0
+    while next_bucket < buckets:
+        bucket = next_bucket
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        next_bucket = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def get_shard(sensor_id, shard_count: int = SHARD_COUNT) -> int:
+    if shard_count <= 1:
+        return 0
+    # a stable digest, unlike hash() which is salted per process
+    digest = hashlib.blake2b(str(sensor_id).encode("utf-8"), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "little"), shard_count)
+
+def shard_attributes(sensor_id, shard_count: int = SHARD_COUNT) -> dict | None:
+    """SNS message attributes routing the reading to the queues of its shard, None if unsharded."""
+    if shard_count <= 1:
+        return None
+    # a String matched exactly, so that the template can generate the filter policy of every shard
+    return {SHARD_ATTRIBUTE: {"DataType": "String", "StringValue": str(get_shard(sensor_id, shard_count))}}
+
+def owns_sensor(sensor_id) -> bool:
+    return SHARD_COUNT <= 1 or get_shard(sensor_id) == SHARD_INDEX
+
+def check_shard(sensor_id) -> bool:
+    """
+    Returns True if this consumer owns the sensor. A reading of another shard
+    is still processed, only counted, since dropping it would lose it.
+    """
+    if owns_sensor(sensor_id):
+        return True
+    metrics.count(SHARD_MISROUTED)
+    logger.warning("Sensor %s belongs to shard %d, not %d", sensor_id, get_shard(sensor_id), SHARD_INDEX)
+    return False
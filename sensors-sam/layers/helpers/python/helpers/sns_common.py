@@ -2,6 +2,8 @@ import boto3
 from botocore.exceptions import ClientError
 from helpers.logs import get_logger
 from helpers.config import get_region, InternalServerError
+from helpers.metrics import metrics, PUBLISH_LATENCY
+from helpers.warmup import register_warmup
 
 logger = get_logger(__name__)
 
@@ -15,10 +17,16 @@ class SNSClient:
             self.clients[region] = boto3.client("sns", region_name=region)
         return self.clients[region]
 
-    def publish_message(self, topic_arn: str, message: str, region: str | None = None):
+    def publish_message(self, topic_arn: str, message: str, region: str | None = None, attributes: dict | None = None, subject: str | None = None):
         try:
             client = self.get_client(region)
-            response = client.publish(TopicArn=topic_arn, Message=message)
+            params = {"TopicArn": topic_arn, "Message": message}
+            if attributes:
+                params["MessageAttributes"] = attributes
+            if subject:
+                params["Subject"] = subject
+            with metrics.timer(PUBLISH_LATENCY):
+                response = client.publish(**params)
             logger.debug("RESPONSE: %s", response)
             return response
         except ClientError as e:
@@ -30,3 +38,4 @@ class SNSClient:
 
 
 sns_client = SNSClient()
+register_warmup("sns_client", sns_client.get_client)
@@ -0,0 +1,120 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextlib import ContextDecorator
+from helpers.logs import get_logger
+from helpers.metrics import metrics
+
+logger = get_logger(__name__)
+
+TRACE_ATTRIBUTE = "trace_id"
+TRACE_HEADER = "x-amzn-trace-id"
+TRACE_PROPAGATION_ENABLED = os.getenv("TRACE_PROPAGATION_ENABLED", default="false").lower() == "true"
+SPAN_METRIC_PREFIX = "Span."
+
+# 1 in PROFILE_SAMPLE_RATE invocations is profiled, 0 disables the profiler
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", default="0"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", default="25"))
+PROFILE_SORT_KEY = os.getenv("PROFILE_SORT_KEY", default="cumulative")
+
+_local = threading.local()
+_spans_lock = threading.Lock()
+_spans: dict[str, list[float]] = {}
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+def set_trace_id(trace_id: str | None) -> None:
+    _local.trace_id = trace_id
+
+def get_trace_id() -> str | None:
+    return getattr(_local, "trace_id", None)
+
+def trace_id_from_event(event: dict) -> str:
+    headers: dict = event.get("headers") or {}
+    return headers.get(TRACE_HEADER) or new_trace_id()
+
+def trace_id_from_record(record: dict, sensor_data: dict | None = None) -> str | None:
+    """Reads the trace id from SQS message attributes, falling back to the package id."""
+    attributes: dict = record.get("messageAttributes") or {}
+    trace_attribute: dict = attributes.get(TRACE_ATTRIBUTE) or {}
+    trace_id = trace_attribute.get("stringValue")
+    if not trace_id and sensor_data:
+        trace_id = sensor_data.get("package_id")
+    return trace_id
+
+def trace_attributes() -> dict | None:
+    """SNS message attributes propagating the current trace id, if propagation is enabled."""
+    trace_id = get_trace_id()
+    if not TRACE_PROPAGATION_ENABLED or not trace_id:
+        return None
+    return {TRACE_ATTRIBUTE: {"DataType": "String", "StringValue": trace_id}}
+
+class span(ContextDecorator):
+    """Records the duration of one stage of the invocation, optionally under an existing metric name."""
+    def __init__(self, name: str, metric_name: str | None = None):
+        self.name = name
+        self.metric_name = metric_name or f"{SPAN_METRIC_PREFIX}{name}"
+        self._local = threading.local()
+
+    def __enter__(self) -> "span":
+        self._local.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        elapsed_ms = (time.perf_counter() - self._local.start) * 1000
+        with _spans_lock:
+            _spans.setdefault(self.name, []).append(elapsed_ms)
+        metrics.timing(self.metric_name, elapsed_ms)
+        return False
+
+def get_span_summary() -> dict[str, dict]:
+    with _spans_lock:
+        return {
+            name: {"count": len(durations), "total_ms": round(sum(durations), 3), "max_ms": round(max(durations), 3)}
+            for name, durations in _spans.items()
+        }
+
+def _reset_spans() -> None:
+    with _spans_lock:
+        _spans.clear()
+
+def _should_profile() -> bool:
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < 1.0 / PROFILE_SAMPLE_RATE
+
+def _log_profile(profiler: cProfile.Profile, name: str) -> None:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(PROFILE_SORT_KEY).print_stats(PROFILE_TOP_N)
+    logger.info("PROFILE %s trace_id=%s\n%s", name, get_trace_id(), stream.getvalue())
+
+def traced(handler):
+    """
+    Decorator for lambda_handler: collects the spans of the invocation, logs
+    their summary and runs the sampling profiler for 1 in PROFILE_SAMPLE_RATE invocations.
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context, *args, **kwargs):
+        _reset_spans()
+        set_trace_id(None)
+        profiler = cProfile.Profile() if _should_profile() else None
+        try:
+            if profiler is None:
+                return handler(event, context, *args, **kwargs)
+            profiler.enable()
+            try:
+                return handler(event, context, *args, **kwargs)
+            finally:
+                profiler.disable()
+                _log_profile(profiler, handler.__module__)
+        finally:
+            summary = get_span_summary()
+            if summary:
+                logger.debug("SPANS trace_id=%s %s", get_trace_id(), summary)
+    return wrapper
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from typing import Callable
+from helpers.logs import get_logger
+
+logger = get_logger(__name__)
+
+# on by default inside Lambda only, so local harnesses install their fakes before anything is created
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", default="true" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") else "false").lower() == "true"
+WARMUP_BUDGET_SECONDS = float(os.getenv("WARMUP_BUDGET_SECONDS", default="2")) # per action
+WARMUP_TOTAL_BUDGET_SECONDS = float(os.getenv("WARMUP_TOTAL_BUDGET_SECONDS", default="6")) # init is limited to 10s
+
+try:
+    # available in Lambda runtimes with SnapStart
+    from snapshot_restore_py import register_after_restore
+except ImportError:
+    register_after_restore = None
+
+WARMUP_OK = "ok"
+WARMUP_ERROR = "error"
+WARMUP_TIMEOUT = "timeout"
+WARMUP_SKIPPED = "skipped"
+
+class WarmupAction:
+    def __init__(self, name: str, action: Callable[[], object], budget_seconds: float):
+        self.name = name
+        self.action = action
+        self.budget_seconds = budget_seconds
+
+_actions: dict[str, WarmupAction] = {}
+_restore_names: dict[str, None] = {} # ordered like the run_warmup calls
+_restore_registered = False
+
+def register_warmup(name: str, action: Callable[[], object], budget_seconds: float = WARMUP_BUDGET_SECONDS) -> None:
+    """Declares an idempotent warm-up action creating an expensive first-use resource."""
+    _actions[name] = WarmupAction(name, action, budget_seconds)
+
+def run_action(name: str, action: Callable[[], object], budget_seconds: float) -> str:
+    """Runs the action on its own thread so that a slow action only costs its budget."""
+    errors: list[Exception] = []
+
+    def run() -> None:
+        try:
+            action()
+        except Exception as e:
+            errors.append(e)
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=run, name=f"warmup-{name}", daemon=True)
+    thread.start()
+    thread.join(budget_seconds)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if thread.is_alive():
+        # the action keeps running, the first request finds it done or creates the resource itself
+        logger.warning("Warm-up %s exceeded its budget of %.1fs", name, budget_seconds)
+        return WARMUP_TIMEOUT
+    if errors:
+        logger.error("Warm-up %s failed after %.1f ms: %s", name, elapsed_ms, errors[0])
+        return WARMUP_ERROR
+    logger.info("Warm-up %s done in %.1f ms", name, elapsed_ms)
+    return WARMUP_OK
+
+def _run(names: tuple[str, ...]) -> dict[str, str]:
+    results: dict[str, str] = {}
+    deadline = time.monotonic() + WARMUP_TOTAL_BUDGET_SECONDS
+    for name in names:
+        warmup_action = _actions.get(name)
+        remaining = deadline - time.monotonic()
+        if warmup_action is None or remaining <= 0:
+            logger.warning("Warm-up %s skipped: %s", name, "not registered" if warmup_action is None else "total budget exhausted")
+            results[name] = WARMUP_SKIPPED
+            continue
+        results[name] = run_action(name, warmup_action.action, min(warmup_action.budget_seconds, remaining))
+    return results
+
+def _after_restore() -> None:
+    # resources of the snapshot may be stale (connections, fetched keys), the actions run again
+    _run(tuple(_restore_names))
+
+def run_warmup(*names: str) -> dict[str, str]:
+    """
+    Runs the named actions, in order, at module load of a handler so that the
+    Lambda init phase pays for them instead of the first request. Returns the
+    result of each action; nothing runs unless WARMUP_ENABLED.
+    """
+    global _restore_registered
+    if not WARMUP_ENABLED:
+        return {}
+    if register_after_restore is not None:
+        _restore_names.update(dict.fromkeys(names))
+        if not _restore_registered:
+            register_after_restore(_after_restore)
+            _restore_registered = True
+    return _run(names)
@@ -1,11 +1,30 @@
 import os
+import csv
+import io
 import json
+import time
 import boto3
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
 
 SUCCESS = "SUCCESS"
 FAILED = "FAILED"
 
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCE_URI = "sensor_params.ndjson" # bundled next to this file
+MODE_UPSERT = "upsert"
+MODE_INSERT_ONLY = "insert-only"
+DEFAULT_WORKERS = 8
+BATCH_GET_SIZE = 100 # DynamoDB BatchGetItem limit
+BATCH_GET_ATTEMPTS = 5
+TIME_RESERVE_SECONDS = 15 # kept to report FAILED before the Lambda timeout
+REQUIRED_ATTRIBUTES = ("min_value", "max_value")
+DETECTOR_TYPES = ("drift", "stuck", "rate") # values of the optional comma-separated detectors column
+
+class SeedTimeoutError(Exception):
+    pass
+
 def send_response(event, context, status, data=None):
     response_body = {
         "Status": status,
@@ -25,37 +44,140 @@ def send_response(event, context, status, data=None):
     )
     urllib.request.urlopen(req)
 
-def seed_default_parameters() -> None:
-    """Seed the DynamoDB table with default sensor parameters on stack creation."""
-    default_params = [
-        {"sensor_id": "101", "min_value": 43, "max_value": 73},
-        {"sensor_id": "102", "min_value": 52, "max_value": 82},
-        {"sensor_id": "103", "min_value": 38, "max_value": 68},
-        {"sensor_id": "104", "min_value": 65, "max_value": 95},
-        {"sensor_id": "105", "min_value": 25, "max_value": 35},
-        {"sensor_id": "106", "min_value": 32, "max_value": 52},
-        {"sensor_id": "107", "min_value": 17, "max_value": 47},
-        {"sensor_id": "108", "min_value": 11, "max_value": 31},
-    ]
-    table_name = os.environ.get("DYNAMODB_TABLE_NAME")
-    resource = boto3.resource("dynamodb")
-    table = resource.Table(table_name)
+def read_source(source_uri: str) -> str:
+    """Reads s3://bucket/key or a file bundled with the function."""
+    if source_uri.startswith("s3://"):
+        bucket, _, key = source_uri.removeprefix("s3://").partition("/")
+        response = boto3.client("s3").get_object(Bucket=bucket, Key=key)
+        return response["Body"].read().decode("utf-8")
+    with open(os.path.join(SOURCE_DIR, source_uri), encoding="utf-8") as f:
+        return f.read()
+
+def parse_value(value):
+    """Converts numbers and numeric strings to int or Decimal, the types DynamoDB accepts."""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float, Decimal)):
+        return value
+    try:
+        number = Decimal(str(value).strip())
+    except InvalidOperation:
+        return value
+    return int(number) if number == number.to_integral_value() else number
+
+def normalize_item(raw: dict) -> dict:
+    sensor_id = str(raw.get("sensor_id") or "").strip()
+    if not sensor_id:
+        raise ValueError(f"sensor_id is required: {raw}")
+    item = {"sensor_id": sensor_id}
+    for name, value in raw.items():
+        if name != "sensor_id" and value not in (None, ""):
+            item[name] = parse_value(value)
+    for name in REQUIRED_ATTRIBUTES:
+        if not isinstance(item.get(name), int):
+            raise ValueError(f"Integer {name} is required for sensor {sensor_id}")
+    if item["min_value"] > item["max_value"]:
+        raise ValueError(f"min_value is above max_value for sensor {sensor_id}")
+    unknown = {name.strip() for name in str(item.get("detectors", "")).split(",") if name.strip()} - set(DETECTOR_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown detectors {', '.join(sorted(unknown))} for sensor {sensor_id}")
+    stuck_readings = item.get("stuck_readings")
+    if stuck_readings is not None and (not isinstance(stuck_readings, int) or stuck_readings < 2):
+        raise ValueError(f"Integer stuck_readings of at least 2 is required for sensor {sensor_id}")
+    return item
+
+def parse_items(source_uri: str, text: str) -> list[dict]:
+    """Parses CSV, NDJSON or a JSON array by extension; later rows win for duplicate sensor ids."""
+    path = source_uri.lower()
+    if path.endswith(".csv"):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    elif path.endswith((".ndjson", ".jsonl")):
+        rows = [json.loads(line, parse_float=Decimal) for line in text.splitlines() if line.strip()]
+    else:
+        rows = json.loads(text, parse_float=Decimal)
+    items = {}
+    for row in rows:
+        item = normalize_item(row)
+        items[item["sensor_id"]] = item
+    return list(items.values())
 
-    for item in default_params:
-        table.put_item(Item=item, ConditionExpression="attribute_not_exists(sensor_id)")
-    
+def check_deadline(deadline: float) -> None:
+    if time.monotonic() > deadline:
+        raise SeedTimeoutError("Seeding did not finish within the custom resource timeout")
 
+def chunks(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def get_existing_sensor_ids(table_name: str, sensor_ids: list[str], deadline: float) -> set[str]:
+    client = boto3.session.Session().client("dynamodb")
+    existing = set()
+    request = {table_name: {
+        "Keys": [{"sensor_id": {"S": sensor_id}} for sensor_id in sensor_ids],
+        "ProjectionExpression": "sensor_id",
+    }}
+    for attempt in range(BATCH_GET_ATTEMPTS):
+        check_deadline(deadline)
+        response = client.batch_get_item(RequestItems=request)
+        existing.update(item["sensor_id"]["S"] for item in response.get("Responses", {}).get(table_name, []))
+        request = response.get("UnprocessedKeys") or {}
+        if not request:
+            return existing
+        time.sleep(0.05 * 2 ** attempt)
+    raise RuntimeError(f"Could not read {len(request[table_name]['Keys'])} keys of {table_name}")
+
+def write_items(table_name: str, items: list[dict], deadline: float) -> int:
+    # sessions are not shared between worker threads
+    table = boto3.session.Session().resource("dynamodb").Table(table_name)
+    with table.batch_writer(overwrite_by_pkeys=["sensor_id"]) as batch:
+        for item in items:
+            check_deadline(deadline)
+            batch.put_item(Item=item)
+    return len(items)
+
+def seed_sensor_parameters(properties: dict, context) -> dict:
+    """
+    Seeds the sensor parameters table from SourceUri (bundled file or S3 object).
+    Mode insert-only skips sensors that already exist, upsert overwrites them.
+    """
+    table_name = os.environ.get("DYNAMODB_TABLE_NAME")
+    source_uri = properties.get("SourceUri") or DEFAULT_SOURCE_URI
+    mode = properties.get("Mode") or MODE_INSERT_ONLY
+    if mode not in (MODE_UPSERT, MODE_INSERT_ONLY):
+        raise ValueError(f"Unknown seed mode: {mode}")
+    workers = int(properties.get("Workers") or DEFAULT_WORKERS)
+    deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - TIME_RESERVE_SECONDS
+
+    items = parse_items(source_uri, read_source(source_uri))
+    print(f"{len(items)} sensor parameters read from {source_uri}")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        to_write = items
+        if mode == MODE_INSERT_ONLY:
+            sensor_ids = [item["sensor_id"] for item in items]
+            existing = set().union(*executor.map(
+                lambda keys: get_existing_sensor_ids(table_name, keys, deadline),
+                chunks(sensor_ids, BATCH_GET_SIZE),
+            ))
+            to_write = [item for item in items if item["sensor_id"] not in existing]
+        chunk_size = max(1, -(-len(to_write) // workers))
+        written = sum(executor.map(
+            lambda chunk: write_items(table_name, chunk, deadline),
+            chunks(to_write, chunk_size),
+        ))
+    result = {
+        "SourceUri": source_uri,
+        "Mode": mode,
+        "Total": len(items),
+        "Written": written,
+        "Skipped": len(items) - written,
+    }
+    print("RESULT: ", json.dumps(result))
+    return result
 
 def lambda_handler(event, context):
     try:
         print("EVENT: ", json.dumps(event))
         request_type = event["RequestType"]
 
-        if request_type == "Create":
-            result = seed_default_parameters()
-            send_response(event, context, SUCCESS, result)
-        elif request_type == "Update":
-            result = seed_default_parameters()
+        if request_type in ("Create", "Update"):
+            result = seed_sensor_parameters(event.get("ResourceProperties", {}), context)
             send_response(event, context, SUCCESS, result)
         elif request_type == "Delete":
             # Nothing to clean up — table deletion is handled by CloudFormation
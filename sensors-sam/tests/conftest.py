@@ -0,0 +1,10 @@
+import pytest
+from local_pipeline import LocalPipeline
+
+@pytest.fixture
+def pipeline(tmp_path) -> LocalPipeline:
+    """Handlers wired to fresh in-memory SNS, SQS and DynamoDB stand-ins."""
+    return LocalPipeline(alert_store_dir=str(tmp_path))
+
+def get_consumer(pipeline: LocalPipeline, name: str):
+    return next(consumer for consumer in pipeline.consumers if consumer.name == name)
@@ -0,0 +1,281 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import logging
+from collections import Counter
+from typing import Iterable, Iterator, Optional
+import aiohttp
+from create_data_stream import API_URL, SENSORS, login
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+logging.basicConfig(
+    format=LOG_FORMAT,
+    level=logging.WARNING,
+)
+logger = logging.getLogger("load_generator")
+logger.setLevel(logging.INFO)
+
+DEFAULT_PROFILE = "constant:20:60" # stages: constant:<rps>:<seconds>, ramp:<from_rps>:<to_rps>:<seconds>
+POOL_SIZE = 64 # keep-alive connections in the pool
+MAX_IN_FLIGHT = 1024 # requests beyond this are counted as client overload, never delayed
+REQUEST_TIMEOUT_SECONDS = 10
+PERCENTILES = (50, 90, 99, 99.9)
+CLIENT_ERROR_STATUS = -1
+CLIENT_OVERLOAD_STATUS = -2
+
+class LatencyHistogram:
+    """
+    HDR-style histogram: log2 buckets split into linear sub-buckets,
+    so every recorded value keeps about 1/SUB_BUCKETS relative precision.
+    """
+    SUB_BUCKETS = 128
+
+    def __init__(self):
+        self.counts: Counter[int] = Counter()
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def _index(self, value_us: int) -> int:
+        if value_us < self.SUB_BUCKETS:
+            return value_us
+        exponent = value_us.bit_length() - 1
+        sub_bucket = (value_us >> (exponent - 7)) - self.SUB_BUCKETS
+        return exponent * self.SUB_BUCKETS + sub_bucket
+
+    def _upper_bound(self, index: int) -> int:
+        if index < self.SUB_BUCKETS:
+            return index
+        exponent, sub_bucket = divmod(index, self.SUB_BUCKETS)
+        return ((self.SUB_BUCKETS + sub_bucket + 1) << (exponent - 7)) - 1
+
+    def record(self, seconds: float) -> None:
+        value_us = max(0, int(seconds * 1_000_000))
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile_ms(self, percentile: float) -> float:
+        if not self.total:
+            return 0.0
+        rank = max(1, math.ceil(self.total * percentile / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper_bound(index), self.max_us) / 1000
+        return self.max_us / 1000
+
+    def summary(self) -> dict:
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_us / self.total / 1000, 3) if self.total else 0.0,
+            **{f"p{p}_ms": round(self.percentile_ms(p), 3) for p in PERCENTILES},
+            "max_ms": round(self.max_us / 1000, 3),
+        }
+
+class Stage:
+    def __init__(self, start_rps: float, end_rps: float, duration: float):
+        self.start_rps = start_rps
+        self.end_rps = end_rps
+        self.duration = duration
+
+    def rate_at(self, elapsed: float) -> float:
+        return self.start_rps + (self.end_rps - self.start_rps) * min(1.0, elapsed / self.duration)
+
+def parse_profile(profile: str) -> list[Stage]:
+    stages = []
+    for spec in profile.split(","):
+        kind, *values = spec.strip().split(":")
+        if kind == "constant" and len(values) == 2:
+            stages.append(Stage(float(values[0]), float(values[0]), float(values[1])))
+        elif kind == "ramp" and len(values) == 3:
+            stages.append(Stage(float(values[0]), float(values[1]), float(values[2])))
+        else:
+            raise ValueError(f"Invalid profile stage: {spec}")
+    return stages
+
+def schedule(stages: list[Stage], poisson: bool, random_generator: random.Random) -> Iterator[float]:
+    """Yields intended send offsets (seconds from the start) independently of the responses."""
+    stage_start = 0.0
+    offset = 0.0
+    for stage in stages:
+        stage_end = stage_start + stage.duration
+        while True:
+            rate = stage.rate_at(offset - stage_start)
+            if rate <= 0:
+                offset += 0.1
+            else:
+                offset += random_generator.expovariate(rate) if poisson else 1.0 / rate
+            if offset >= stage_end:
+                break
+            yield offset
+        stage_start = stage_end
+        offset = max(offset, stage_start)
+
+def random_payloads(random_generator: random.Random) -> Iterator[dict]:
+    while True:
+        yield random_generator.choice(SENSORS).get_sensor_data(random_generator)
+
+class LoadResults:
+    def __init__(self):
+        self.latency: dict[int, LatencyHistogram] = {}
+        self.service_time: dict[int, LatencyHistogram] = {}
+        self.in_flight = 0
+        self.sent = 0
+
+    def record(self, status: int, latency: float, service_time: float) -> None:
+        self.latency.setdefault(status, LatencyHistogram()).record(latency)
+        self.service_time.setdefault(status, LatencyHistogram()).record(service_time)
+
+    def report(self, target_requests: int, duration: float) -> dict:
+        overall = LatencyHistogram()
+        for histogram in self.latency.values():
+            overall.merge(histogram)
+        completed = overall.total - self.latency.get(CLIENT_OVERLOAD_STATUS, LatencyHistogram()).total
+        return {
+            "target_requests": target_requests,
+            "sent_requests": self.sent,
+            "completed_requests": completed,
+            "duration_seconds": round(duration, 3),
+            "achieved_rps": round(completed / duration, 3) if duration else 0.0,
+            "latency": overall.summary(),
+            "by_status": {
+                str(status): {
+                    "latency": histogram.summary(),
+                    "service_time": self.service_time[status].summary(),
+                }
+                for status, histogram in sorted(self.latency.items())
+            },
+        }
+
+async def send_request(
+        session: aiohttp.ClientSession,
+        url: str,
+        payload: dict,
+        intended_start: float,
+        results: LoadResults,
+    ) -> None:
+    actual_start = time.perf_counter()
+    results.in_flight += 1
+    try:
+        async with session.post(url, json=payload) as response:
+            await response.read()
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.debug("Request error: %s", e)
+        status = CLIENT_ERROR_STATUS
+    finally:
+        results.in_flight -= 1
+    finished = time.perf_counter()
+    # latency is measured from the intended start to avoid coordinated omission
+    results.record(status, finished - intended_start, finished - actual_start)
+
+def scheduled_payloads(
+        stages: list[Stage],
+        payloads: Iterator[dict],
+        poisson: bool = False,
+        seed: Optional[int] = None,
+    ) -> Iterator[tuple[float, dict]]:
+    return zip(schedule(stages, poisson, random.Random(seed)), payloads)
+
+async def run_load(
+        url: str,
+        headers: dict,
+        arrivals: Iterable[tuple[float, dict]],
+        pool_size: int = POOL_SIZE,
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ) -> dict:
+    """Sends each payload at its offset (seconds from the start) regardless of the pending responses."""
+    results = LoadResults()
+    connector = aiohttp.TCPConnector(limit=pool_size, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS)
+    tasks: set[asyncio.Task] = set()
+    target_requests = 0
+    async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout) as session:
+        start = time.perf_counter()
+        for offset, payload in arrivals:
+            intended_start = start + offset
+            delay = intended_start - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            target_requests += 1
+            if results.in_flight >= max_in_flight:
+                results.record(CLIENT_OVERLOAD_STATUS, 0.0, 0.0)
+                continue
+            results.sent += 1
+            task = asyncio.create_task(send_request(session, url, payload, intended_start, results))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+    return results.report(target_requests, duration)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Open-loop load generator for sensors ingress")
+    parser.add_argument("username", nargs="?", help="Username used for login")
+    parser.add_argument("password", nargs="?", help="Password used for login")
+    parser.add_argument("--token", help="Access token used instead of login")
+    parser.add_argument("--url", default=API_URL, help="Ingress URL")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, help="Load profile, e.g. ramp:10:200:60,constant:200:120")
+    parser.add_argument("--poisson", action="store_true", help="Use Poisson arrivals instead of a fixed interval")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="Number of pooled keep-alive connections")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT, help="Maximum number of requests in flight")
+    parser.add_argument("--seed", type=int, help="Random seed")
+    parser.add_argument("--report", help="Path of the JSON report, stdout if omitted")
+    parser.add_argument("--workload", help="Fleet file or synthetic:<n> sent by the workload generator for the profile duration")
+    if any(arg.split("=")[0] == "--workload" for arg in sys.argv):
+        from workload_generator import add_workload_arguments
+        add_workload_arguments(parser)
+    return parser.parse_args()
+
+def get_arrivals(args: argparse.Namespace) -> Iterator[tuple[float, dict]]:
+    stages = parse_profile(args.profile)
+    if not args.workload:
+        return scheduled_payloads(stages, random_payloads(random.Random(args.seed)), args.poisson, args.seed)
+    import numpy as np
+    from workload_generator import WorkloadGenerator, get_fleet, workload_config_from_args
+    fleet = get_fleet(args.workload, np.random.default_rng(args.seed))
+    generator = WorkloadGenerator(fleet, workload_config_from_args(args), args.seed)
+    return generator.arrivals(sum(stage.duration for stage in stages), args.batch_seconds)
+
+def get_headers(args: argparse.Namespace) -> Optional[dict]:
+    access_token = args.token
+    if not access_token:
+        if not args.username or not args.password:
+            logger.error("Username and password or --token are required")
+            return None
+        access_token = login(args.username, args.password)
+        if not access_token:
+            logger.error("Failed to login")
+            return None
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json",
+    }
+
+if __name__ == "__main__":
+    args = parse_args()
+    headers = get_headers(args)
+    if headers is not None:
+        report = asyncio.run(run_load(args.url, headers, get_arrivals(args), args.pool_size, args.max_in_flight))
+        report_json = json.dumps(report, indent=2)
+        if args.report:
+            with open(args.report, "w") as f:
+                f.write(report_json)
+            logger.info("Report written to %s", args.report)
+        else:
+            print(report_json)
@@ -0,0 +1,533 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+import logging
+from typing import Callable, Iterator, Optional
+
+SAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIRS = [
+    "layers/helpers/python",
+    "functions/sensors-ingress/src",
+    "functions/sensors-abnormal-lambda/src",
+    "functions/sensors-avg-lambda/src",
+    "functions/sensors-alert-sink/src",
+    "functions/sensors-store/src",
+]
+for source_dir in SOURCE_DIRS:
+    sys.path.insert(0, os.path.join(SAM_DIR, source_dir))
+
+# must be set before the helpers are imported
+os.environ.setdefault("METRICS_ENABLED", "false")
+os.environ.setdefault("DEBUG_LEVEL", "WARNING")
+os.environ.setdefault("AWS_REGION", "il-central-1")
+
+from botocore.exceptions import ClientError
+from create_data_stream import SENSORS, default_params
+from load_generator import LatencyHistogram
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+logging.basicConfig(
+    format=LOG_FORMAT,
+    level=logging.WARNING,
+)
+logger = logging.getLogger("local_pipeline")
+logger.setLevel(logging.INFO)
+
+ARN_PREFIX = "arn:aws:sns:il-central-1:000000000000:"
+INGRESS_TOPIC = "sns-sensors-ingress"
+AVERAGE_TOPIC = "sns-sensors-average"
+ABNORMAL_LOW_TOPIC = "sns-sensors-abnormal-lo"
+ABNORMAL_HIGH_TOPIC = "sns-sensors-abnormal-hi"
+PARAMETERS_TABLE = "sensor-parameters"
+READINGS_TABLE = "sensor-readings"
+QUERY_PAGE_ITEMS = 10 # small so that the readers paginate
+
+# queue and event source mapping settings mirroring template.yaml defaults
+SQS_BATCH_SIZE = 10
+SQS_BATCHING_WINDOW_SECONDS = 5
+SQS_VISIBILITY_TIMEOUT_SECONDS = 30
+SQS_MAX_RECEIVE_COUNT = 5 # SqsMaxReceiveCount of the redrive policies, dead letters stand for the -dlq queues
+ALERT_SINK_BATCH_SIZE = 500
+ALERT_SINK_BATCHING_WINDOW_SECONDS = 30
+STORE_BATCH_SIZE = 1000
+STORE_BATCHING_WINDOW_SECONDS = 20
+
+N_READINGS = 2000
+READINGS_PER_SECOND = 50.0
+
+class VirtualClock:
+    def __init__(self, start: float | None = None):
+        self.now = start if start is not None else time.time()
+
+    def time(self) -> float:
+        return self.now
+
+class FakeQueue:
+    """In-memory SQS queue honoring visibility timeout, receive count and a dead-letter list."""
+    def __init__(self, name: str, clock: VirtualClock, visibility_timeout: float, max_receive_count: int):
+        self.name = name
+        self.clock = clock
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.messages: dict[str, dict] = {}
+        self.dead_letters: list[dict] = []
+        self.sent = 0
+        self.deleted = 0
+
+    def send(self, body: str, attributes: dict | None = None) -> str:
+        message_id = str(uuid.uuid4())
+        now = self.clock.time()
+        self.messages[message_id] = {
+            "messageId": message_id,
+            "body": body,
+            "messageAttributes": attributes or {},
+            "sent_at": now,
+            "visible_at": now,
+            "receive_count": 0,
+        }
+        self.sent += 1
+        return message_id
+
+    def visible(self) -> list[dict]:
+        now = self.clock.time()
+        return [message for message in self.messages.values() if message["visible_at"] <= now]
+
+    def next_visible_at(self) -> Optional[float]:
+        return min((message["visible_at"] for message in self.messages.values()), default=None)
+
+    def receive(self, max_messages: int) -> list[dict]:
+        now = self.clock.time()
+        received = []
+        for message in sorted(self.visible(), key=lambda m: m["visible_at"])[:max_messages]:
+            if message["receive_count"] >= self.max_receive_count:
+                self.dead_letters.append(self.messages.pop(message["messageId"]))
+                continue
+            message["receive_count"] += 1
+            message["visible_at"] = now + self.visibility_timeout
+            received.append(message)
+        return received
+
+    def delete(self, message_id: str) -> Optional[dict]:
+        message = self.messages.pop(message_id, None)
+        if message is not None:
+            self.deleted += 1
+        return message
+
+    @staticmethod
+    def to_record(message: dict) -> dict:
+        return {
+            "messageId": message["messageId"],
+            "receiptHandle": message["messageId"],
+            "body": message["body"],
+            "attributes": {
+                "ApproximateReceiveCount": str(message["receive_count"]),
+                "SentTimestamp": str(int(message["sent_at"] * 1000)),
+            },
+            "messageAttributes": message["messageAttributes"],
+            "eventSource": "aws:sqs",
+        }
+
+class FakeSNSClient:
+    """boto3-shaped SNS client delivering raw messages to subscribed queues."""
+    def __init__(self):
+        self.subscriptions: dict[str, list[FakeQueue]] = {}
+        self.published: dict[str, int] = {}
+
+    def subscribe(self, topic_arn: str, queue: FakeQueue) -> None:
+        self.subscriptions.setdefault(topic_arn, []).append(queue)
+
+    def publish(self, TopicArn: str, Message: str, MessageAttributes: dict | None = None, **kwargs) -> dict:
+        self.published[TopicArn] = self.published.get(TopicArn, 0) + 1
+        attributes = {
+            name: {"stringValue": value.get("StringValue"), "dataType": value.get("DataType")}
+            for name, value in (MessageAttributes or {}).items()
+        }
+        for queue in self.subscriptions.get(TopicArn, []):
+            queue.send(Message, attributes)
+        return {"MessageId": str(uuid.uuid4())}
+
+SET_CLAUSE_PATTERN = re.compile(
+    r"^(?P<name>\w+) = (?:"
+    r"list_append\(if_not_exists\(\w+, (?P<empty>:\w+)\), (?P<append>:\w+)\)"
+    r"|if_not_exists\(\w+, (?P<zero>:\w+)\) \+ (?P<add>:\w+)"
+    r"|(?P<value>:\w+))$"
+)
+
+# "attribute_not_exists(name) OR name <= :value" and "< :value", as used by conditional updates
+UPDATE_CONDITION_PATTERN = re.compile(r"^attribute_not_exists\((?P<name>\w+)\) OR (?P=name) (?P<operator><=|<) (?P<value>:\w+)$")
+
+class FakeTable:
+    """In-memory DynamoDB table supporting the operations used by the helpers."""
+    def __init__(self, name: str, key_names: tuple[str, ...]):
+        self.name = name
+        self.key_names = key_names
+        self.items: dict[tuple, dict] = {}
+        self.reads = 0
+        self.writes = 0
+
+    def _key(self, key: dict) -> tuple:
+        return tuple(key[name] for name in self.key_names)
+
+    def get_item(self, Key: dict, **kwargs) -> dict:
+        self.reads += 1
+        item = self.items.get(self._key(Key))
+        return {"Item": dict(item)} if item is not None else {}
+
+    def put_item(self, Item: dict, ConditionExpression: str | None = None, **kwargs) -> dict:
+        self.writes += 1
+        key = self._key(Item)
+        if ConditionExpression and ConditionExpression.startswith("attribute_not_exists") and key in self.items:
+            # "attribute_not_exists(k) OR expires_at < :now" lets expired items be replaced
+            values = kwargs.get("ExpressionAttributeValues") or {}
+            if not ("expires_at < :now" in ConditionExpression and self.items[key].get("expires_at", 0) < values.get(":now", 0)):
+                old_item = self.items[key] if kwargs.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD" else None
+                raise FakeConditionalCheckFailed(f"Item {key} already exists", old_item)
+        self.items[key] = dict(Item)
+        return {}
+
+    def batch_writer(self, **kwargs):
+        return contextlib.nullcontext(self)
+
+    def delete_item(self, Key: dict, **kwargs) -> dict:
+        self.writes += 1
+        self.items.pop(self._key(Key), None)
+        return {}
+
+    def update_item(
+            self,
+            Key: dict,
+            UpdateExpression: str,
+            ExpressionAttributeValues: dict,
+            ConditionExpression: str | None = None,
+            **kwargs,
+        ) -> dict:
+        self.writes += 1
+        if ConditionExpression:
+            condition = UPDATE_CONDITION_PATTERN.match(ConditionExpression)
+            if not condition:
+                raise ValueError(f"Unsupported update condition: {ConditionExpression}")
+            current = self.items.get(self._key(Key), {}).get(condition["name"])
+            limit = ExpressionAttributeValues[condition["value"]]
+            if current is not None and not (current <= limit if condition["operator"] == "<=" else current < limit):
+                raise FakeConditionalCheckFailed(f"Condition of item {self._key(Key)} failed")
+        item = self.items.setdefault(self._key(Key), dict(Key))
+        assignments = UpdateExpression.removeprefix("SET ")
+        for clause in re.split(r",\s*(?=\w+ = )", assignments):
+            match = SET_CLAUSE_PATTERN.match(clause.strip())
+            if not match:
+                raise ValueError(f"Unsupported update clause: {clause}")
+            name = match["name"]
+            if match["append"]:
+                item[name] = item.get(name, ExpressionAttributeValues[match["empty"]]) + ExpressionAttributeValues[match["append"]]
+            elif match["add"]:
+                item[name] = item.get(name, ExpressionAttributeValues[match["zero"]]) + ExpressionAttributeValues[match["add"]]
+            else:
+                item[name] = ExpressionAttributeValues[match["value"]]
+        return {}
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey: dict | None = None, **kwargs) -> dict:
+        self.reads += 1
+        conditions = _flatten_conditions(KeyConditionExpression.get_expression())
+        items = sorted((item for item in self.items.values() if all(condition(item) for condition in conditions)), key=self._key)
+        if ExclusiveStartKey is not None:
+            items = [item for item in items if self._key(item) > self._key(ExclusiveStartKey)]
+        # pages are cut by item count rather than by the 1 MB of DynamoDB
+        page = items[:QUERY_PAGE_ITEMS]
+        response = {"Items": [dict(item) for item in page]}
+        if len(items) > QUERY_PAGE_ITEMS:
+            response["LastEvaluatedKey"] = {name: page[-1][name] for name in self.key_names}
+        return response
+
+    def scan(self, **kwargs) -> dict:
+        self.reads += 1
+        return {"Items": [dict(item) for item in self.items.values()]}
+
+class FakeConditionalCheckFailed(ClientError):
+    def __init__(self, message: str, item: dict | None = None):
+        response = {"Error": {"Code": "ConditionalCheckFailedException", "Message": message}}
+        if item is not None:
+            # returned in the low-level format, as by DynamoDB
+            response["Item"] = {name: {"S": value} if isinstance(value, str) else {"N": str(value)} for name, value in item.items()}
+        super().__init__(response, "PutItem")
+
+def _flatten_conditions(expression: dict) -> list[Callable[[dict], bool]]:
+    operator, values = expression["operator"], expression["values"]
+    if operator == "AND":
+        return [condition for value in values for condition in _flatten_conditions(value.get_expression())]
+    name = values[0].name
+    if operator == "=":
+        return [lambda item: item.get(name) == values[1]]
+    if operator == "BETWEEN":
+        return [lambda item: values[1] <= item.get(name, values[1] - 1) <= values[2]]
+    raise ValueError(f"Unsupported key condition: {operator}")
+
+class FakeDynamoDBResource:
+    def __init__(self):
+        self.tables: dict[str, FakeTable] = {}
+
+    def add_table(self, name: str, key_names: tuple[str, ...]) -> FakeTable:
+        self.tables[name] = FakeTable(name, key_names)
+        return self.tables[name]
+
+    def Table(self, name: str) -> FakeTable:
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems: dict) -> dict:
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.tables[table_name]
+            table.reads += 1
+            keys = [table._key(key) for key in request["Keys"]]
+            responses[table_name] = [dict(table.items[key]) for key in keys if key in table.items]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+class StageStatistics:
+    def __init__(self, name: str):
+        self.name = name
+        self.invocations = 0
+        self.records = 0
+        self.failed = 0
+        self.exec_seconds = 0.0
+        self.latency = LatencyHistogram() # from the send of a message to the end of its successful processing
+
+    def summary(self) -> dict:
+        return {
+            "invocations": self.invocations,
+            "records": self.records,
+            "failed_records": self.failed,
+            "exec_seconds": round(self.exec_seconds, 6),
+            "records_per_exec_second": round(self.records / self.exec_seconds, 1) if self.exec_seconds else 0.0,
+            "mean_batch_size": round(self.records / self.invocations, 2) if self.invocations else 0.0,
+            "latency": self.latency.summary(),
+        }
+
+class QueueConsumer:
+    """Event source mapping: polls one queue and invokes a handler with SQS batches."""
+    def __init__(
+            self,
+            name: str,
+            queue: FakeQueue,
+            handler: Callable,
+            batch_size: int,
+            batching_window: float,
+            environment: dict | None = None,
+        ):
+        self.name = name
+        self.queue = queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self.batching_window = batching_window
+        self.environment = environment or {}
+        self.busy_until = 0.0
+        self.statistics = StageStatistics(name)
+
+    def next_ready_at(self, flushing: bool) -> Optional[float]:
+        """Virtual time of the next invocation, if any message is waiting."""
+        visible = self.queue.visible()
+        if visible:
+            if len(visible) >= self.batch_size or flushing:
+                ready_at = self.queue.clock.time()
+            else:
+                ready_at = min(message["visible_at"] for message in visible) + self.batching_window
+        else:
+            ready_at = self.queue.next_visible_at()
+            if ready_at is None:
+                return None
+            if not flushing:
+                ready_at += self.batching_window
+        return max(ready_at, self.busy_until)
+
+    def invoke(self) -> None:
+        messages = self.queue.receive(self.batch_size)
+        if not messages:
+            return
+        event = {"Records": [FakeQueue.to_record(message) for message in messages]}
+        exec_seconds, response = invoke_handler(self.handler, event, self.environment)
+        clock = self.queue.clock
+        self.busy_until = clock.time() + exec_seconds
+        failed_ids = {failure["itemIdentifier"] for failure in (response or {}).get("batchItemFailures", [])}
+        for message in messages:
+            if message["messageId"] in failed_ids:
+                continue
+            self.queue.delete(message["messageId"])
+            self.statistics.latency.record(self.busy_until - message["sent_at"])
+        self.statistics.invocations += 1
+        self.statistics.records += len(messages)
+        self.statistics.failed += len(failed_ids)
+        self.statistics.exec_seconds += exec_seconds
+
+def invoke_handler(handler: Callable, event: dict, environment: dict) -> tuple[float, dict]:
+    previous = {name: os.environ.get(name) for name in environment}
+    os.environ.update(environment)
+    try:
+        start = time.perf_counter()
+        response = handler(event, None)
+        return time.perf_counter() - start, response
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+class LocalPipeline:
+    """
+    Wires ingress, abnormal, average, store and alert sink handlers together
+    through in-memory SNS, SQS and DynamoDB stand-ins on a virtual clock.
+    """
+    def __init__(
+            self,
+            sqs_batch_size: int = SQS_BATCH_SIZE,
+            sqs_batching_window: float = SQS_BATCHING_WINDOW_SECONDS,
+            visibility_timeout: float = SQS_VISIBILITY_TIMEOUT_SECONDS,
+            alert_store_dir: str | None = None,
+            parameters: list[dict] | None = None,
+        ):
+        import helpers.dynamo_db
+        import helpers.sns_common
+        import sensors_ingress
+        import sensors_abnormal
+        import sensors_avg
+        import sensors_alert_sink
+        import sensors_store
+
+        self.clock = VirtualClock()
+        self.sns = FakeSNSClient()
+        self.dynamodb = FakeDynamoDBResource()
+        parameters_table = self.dynamodb.add_table(PARAMETERS_TABLE, ("sensor_id",))
+        for item in parameters if parameters is not None else default_params:
+            parameters_table.put_item(Item=dict(item))
+        self.dynamodb.add_table(READINGS_TABLE, ("sensor_id", "bucket_start"))
+        if os.environ.get("DEDUP_TABLE_NAME"):
+            self.dynamodb.add_table(os.environ["DEDUP_TABLE_NAME"], ("dedup_key",))
+
+        helpers.sns_common.sns_client.clients = {os.environ["AWS_REGION"]: self.sns}
+        helpers.dynamo_db._dynamodb_resource = self.dynamodb
+        helpers.dynamo_db._dynamodb_tables.clear()
+        helpers.dynamo_db.parameters_table_client.table = None
+        sensors_abnormal._sensor_limits.clear()
+        sensors_ingress.authenticate_user = lambda event: {"sub": "local-pipeline"}
+
+        self.alert_store_dir = alert_store_dir or tempfile.mkdtemp(prefix="alerts-")
+        self.ingress_handler = sensors_ingress.lambda_handler
+        self.ingress_environment = {"SNS_TOPIC_ARN": self.arn(INGRESS_TOPIC)}
+        self.ingress_statistics = StageStatistics("ingress")
+        self.ingress_statuses: dict[int, int] = {}
+
+        def consumer(name: str, topics: list[str], handler: Callable, batch_size: int, batching_window: float, environment: dict) -> QueueConsumer:
+            queue = FakeQueue(f"sqs-sensors-{name}", self.clock, visibility_timeout, SQS_MAX_RECEIVE_COUNT)
+            for topic in topics:
+                self.sns.subscribe(self.arn(topic), queue)
+            return QueueConsumer(name, queue, handler, batch_size, batching_window, environment)
+
+        self.consumers = [
+            consumer("abnormal", [INGRESS_TOPIC], sensors_abnormal.lambda_handler, sqs_batch_size, sqs_batching_window, {
+                "SNS_ABNORMAL_LOW_TOPIC_ARN": self.arn(ABNORMAL_LOW_TOPIC),
+                "SNS_ABNORMAL_HIGH_TOPIC_ARN": self.arn(ABNORMAL_HIGH_TOPIC),
+            }),
+            consumer("avg", [INGRESS_TOPIC], sensors_avg.lambda_handler, sqs_batch_size, sqs_batching_window, {
+                "SNS_TOPIC_ARN": self.arn(AVERAGE_TOPIC),
+            }),
+            consumer("store", [INGRESS_TOPIC], sensors_store.lambda_handler, STORE_BATCH_SIZE, STORE_BATCHING_WINDOW_SECONDS, {}),
+            consumer("alerts", [ABNORMAL_LOW_TOPIC, ABNORMAL_HIGH_TOPIC], sensors_alert_sink.lambda_handler,
+                ALERT_SINK_BATCH_SIZE, ALERT_SINK_BATCHING_WINDOW_SECONDS, {
+                "ALERT_STORE_URI": f"file://{self.alert_store_dir}",
+            }),
+        ]
+
+    @staticmethod
+    def arn(topic: str) -> str:
+        return f"{ARN_PREFIX}{topic}"
+
+    def ingest(self, reading: dict) -> int:
+        event = {
+            "path": "/api/v1/sensors",
+            "httpMethod": "POST",
+            "headers": {"authorization": "Bearer local"},
+            "body": json.dumps(reading),
+        }
+        exec_seconds, response = invoke_handler(self.ingress_handler, event, self.ingress_environment)
+        status = response["statusCode"]
+        self.ingress_statuses[status] = self.ingress_statuses.get(status, 0) + 1
+        self.ingress_statistics.invocations += 1
+        self.ingress_statistics.records += 1
+        self.ingress_statistics.failed += status >= 400
+        self.ingress_statistics.exec_seconds += exec_seconds
+        self.ingress_statistics.latency.record(exec_seconds)
+        return status
+
+    def step(self, until: float | None) -> bool:
+        """Runs the next due consumer invocation before `until`; returns False when nothing is due."""
+        flushing = until is None
+        due = [(ready_at, index) for index, c in enumerate(self.consumers) if (ready_at := c.next_ready_at(flushing)) is not None]
+        if not due:
+            return False
+        ready_at, index = min(due)
+        if until is not None and ready_at > until:
+            return False
+        self.clock.now = max(self.clock.now, ready_at)
+        self.consumers[index].invoke()
+        return True
+
+    def run(self, arrivals: Iterator[tuple[float, dict]]) -> dict:
+        """Ingests (offset_seconds, reading) arrivals on the virtual clock and drains all queues."""
+        start_clock, start_wall = self.clock.now, time.perf_counter()
+        for offset, reading in arrivals:
+            arrival = start_clock + offset
+            while self.step(arrival):
+                pass
+            self.clock.now = max(self.clock.now, arrival)
+            self.ingest(reading)
+        while self.step(None):
+            pass
+        return self.report(self.clock.now - start_clock, time.perf_counter() - start_wall)
+
+    def report(self, virtual_seconds: float, wall_seconds: float) -> dict:
+        stages = [self.ingress_statistics, *(c.statistics for c in self.consumers)]
+        return {
+            "virtual_seconds": round(virtual_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            "ingress_statuses": {str(status): count for status, count in sorted(self.ingress_statuses.items())},
+            "published": {topic.removeprefix(ARN_PREFIX): count for topic, count in self.sns.published.items()},
+            "dead_letters": {c.queue.name: len(c.queue.dead_letters) for c in self.consumers},
+            "tables": {name: {"items": len(t.items), "reads": t.reads, "writes": t.writes} for name, t in self.dynamodb.tables.items()},
+            "alert_store": self.alert_store_dir,
+            "stages": {stage.name: stage.summary() for stage in stages},
+        }
+
+def uniform_arrivals(n_readings: int, rate: float, random_generator: random.Random) -> Iterator[tuple[float, dict]]:
+    for i in range(n_readings):
+        sensor = random_generator.choice(SENSORS)
+        reading = sensor.get_sensor_data(random_generator)
+        yield i / rate, reading
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the sensors pipeline in-process with local stand-ins")
+    parser.add_argument("--readings", type=int, default=N_READINGS, help="Number of readings to ingest")
+    parser.add_argument("--rate", type=float, default=READINGS_PER_SECOND, help="Readings per virtual second")
+    parser.add_argument("--batch-size", type=int, default=SQS_BATCH_SIZE, help="SQS batch size of abnormal and avg consumers")
+    parser.add_argument("--batching-window", type=float, default=SQS_BATCHING_WINDOW_SECONDS, help="SQS batching window (seconds)")
+    parser.add_argument("--visibility-timeout", type=float, default=SQS_VISIBILITY_TIMEOUT_SECONDS, help="SQS visibility timeout (seconds)")
+    parser.add_argument("--seed", type=int, help="Random seed")
+    parser.add_argument("--report", help="Path of the JSON report, stdout if omitted")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    pipeline = LocalPipeline(args.batch_size, args.batching_window, args.visibility_timeout)
+    report = pipeline.run(uniform_arrivals(args.readings, args.rate, random.Random(args.seed)))
+    report_json = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(report_json)
+        logger.info("Report written to %s", args.report)
+    else:
+        print(report_json)
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import time
+import logging
+from typing import Iterable, Iterator, Optional
+import boto3
+from local_pipeline import LocalPipeline
+from load_generator import POOL_SIZE, MAX_IN_FLIGHT, get_headers, run_load
+from create_data_stream import default_params
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+logging.basicConfig(
+    format=LOG_FORMAT,
+    level=logging.WARNING,
+)
+logger = logging.getLogger("replay_traffic")
+logger.setLevel(logging.INFO)
+
+LOCAL_TARGET = "local"
+CAPTURE_SUFFIX = ".ndjson.gz"
+REPLICA_SEPARATOR = "-r"
+MAX_SPEED = "max"
+
+class CapturedReading:
+    def __init__(self, received_at: float, reading: dict):
+        self.received_at = received_at
+        self.reading = reading
+
+def list_capture_objects(location: str) -> Iterator[bytes]:
+    """Yields the raw capture objects below a local path or an s3://bucket/prefix location."""
+    if location.startswith("s3://"):
+        bucket, _, prefix = location.removeprefix("s3://").partition("/")
+        s3 = boto3.client("s3")
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for entry in page.get("Contents", []):
+                if entry["Key"].endswith(CAPTURE_SUFFIX):
+                    yield s3.get_object(Bucket=bucket, Key=entry["Key"])["Body"].read()
+        return
+    paths = [location] if os.path.isfile(location) else glob.glob(os.path.join(location, "**", f"*{CAPTURE_SUFFIX}"), recursive=True)
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            yield f.read()
+
+def get_event_readings(captured: dict) -> Iterator[CapturedReading]:
+    """Extracts the sensor readings of a captured ingress request or SQS/SNS batch."""
+    event = captured.get("event") or {}
+    captured_at = captured.get("captured_at", 0.0)
+    if "Records" not in event:
+        if event.get("httpMethod") == "POST" and event.get("body"):
+            yield CapturedReading(captured_at, json.loads(event["body"]))
+        return
+    for record in event["Records"]:
+        body = record["Sns"].get("Message") if "Sns" in record else record.get("body")
+        sent_timestamp = (record.get("attributes") or {}).get("SentTimestamp")
+        received_at = int(sent_timestamp) / 1000 if sent_timestamp else captured_at
+        reading = json.loads(body or "{}")
+        reading.pop("package_id", None)
+        yield CapturedReading(received_at, reading)
+
+def load_captures(locations: list[str], source: Optional[str]) -> list[CapturedReading]:
+    readings = []
+    for location in locations:
+        for data in list_capture_objects(location):
+            for line in gzip.decompress(data).decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                captured = json.loads(line)
+                if source and captured.get("source") != source:
+                    continue
+                try:
+                    readings.extend(get_event_readings(captured))
+                except (ValueError, KeyError) as e:
+                    logger.warning("Skipping malformed captured event: %s", e)
+    readings.sort(key=lambda r: r.received_at)
+    return readings
+
+def replica_sensor_id(sensor_id: str, replica: int) -> str:
+    return sensor_id if replica == 0 else f"{sensor_id}{REPLICA_SEPARATOR}{replica}"
+
+def parse_speed(speed: str) -> Optional[float]:
+    """Returns the time scale factor of 1x, 10x, 2.5 etc., or None for max speed."""
+    if speed == MAX_SPEED:
+        return None
+    factor = float(speed.removesuffix("x"))
+    if factor <= 0:
+        raise ValueError(f"Invalid speed: {speed}")
+    return factor
+
+def replay_arrivals(
+        readings: list[CapturedReading],
+        speed: Optional[float],
+        fleet_multiplier: int = 1,
+        retime: bool = True,
+        start: Optional[float] = None,
+    ) -> Iterator[tuple[float, dict]]:
+    """
+    Yields (offset_seconds, reading) preserving the captured inter-arrival times
+    divided by speed, all at offset 0 for max speed. Every reading is sent once
+    per fleet replica with its sensor_id remapped.
+    """
+    if not readings:
+        return
+    first_received_at = readings[0].received_at
+    start = time.time() if start is None else start
+    for captured in readings:
+        offset = (captured.received_at - first_received_at) / speed if speed else 0.0
+        for replica in range(fleet_multiplier):
+            reading = dict(captured.reading)
+            if "sensor_id" in reading:
+                reading["sensor_id"] = replica_sensor_id(str(reading["sensor_id"]), replica)
+            if retime:
+                reading["timestamp"] = start + offset
+            yield offset, reading
+
+def replica_parameters(parameters: Iterable[dict], fleet_multiplier: int) -> list[dict]:
+    return [
+        {**item, "sensor_id": replica_sensor_id(item["sensor_id"], replica)}
+        for item in parameters
+        for replica in range(fleet_multiplier)
+    ]
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay captured sensors traffic into the local pipeline or an ingress endpoint")
+    parser.add_argument("captures", nargs="+", help="Capture files, directories or s3://bucket/prefix locations")
+    parser.add_argument("--target", default=LOCAL_TARGET, help="'local' for the in-process pipeline or the ingress URL")
+    parser.add_argument("--source", default="ingress", help="Captured source to replay, all sources if empty")
+    parser.add_argument("--speed", default="1x", help="Replay speed: 1x, 10x, ... or max")
+    parser.add_argument("--fleet-multiplier", type=int, default=1, help="Number of remapped sensor replicas per captured sensor")
+    parser.add_argument("--parameters", help="Sensor parameter file of the captured fleet (local target)")
+    parser.add_argument("--keep-timestamps", action="store_true", help="Keep the captured reading timestamps")
+    parser.add_argument("--token", help="Access token used instead of login (HTTP target)")
+    parser.add_argument("--username", help="Username used for login (HTTP target)")
+    parser.add_argument("--password", help="Password used for login (HTTP target)")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE, help="Number of pooled keep-alive connections")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT, help="Maximum number of requests in flight")
+    parser.add_argument("--report", help="Path of the JSON report, stdout if omitted")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    readings = load_captures(args.captures, args.source or None)
+    logger.info("%d captured readings loaded", len(readings))
+    arrivals = replay_arrivals(readings, parse_speed(args.speed), args.fleet_multiplier, not args.keep_timestamps)
+    report = None
+    if args.target == LOCAL_TARGET:
+        parameters = default_params
+        if args.parameters:
+            from workload_generator import load_fleet
+            parameters = load_fleet(args.parameters).to_parameters()
+        pipeline = LocalPipeline(parameters=replica_parameters(parameters, args.fleet_multiplier))
+        report = pipeline.run(arrivals)
+    else:
+        headers = get_headers(args)
+        if headers is not None:
+            report = asyncio.run(run_load(args.target, headers, arrivals, args.pool_size, args.max_in_flight))
+    if report is not None:
+        report_json = json.dumps(report, indent=2)
+        if args.report:
+            with open(args.report, "w") as f:
+                f.write(report_json)
+            logger.info("Report written to %s", args.report)
+        else:
+            print(report_json)
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import logging
+from typing import Callable
+from local_pipeline import ARN_PREFIX, FakeDynamoDBResource, FakeSNSClient, PARAMETERS_TABLE
+from create_data_stream import SENSORS, default_params
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+logging.basicConfig(
+    format=LOG_FORMAT,
+    level=logging.WARNING,
+)
+logger = logging.getLogger("run_benchmarks")
+logger.setLevel(logging.INFO)
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baselines.json")
+MIN_SECONDS = 2.0 # measuring time per benchmark
+ROUNDS = 5
+WARMUP_OPS = 20
+ALLOCATION_OPS = 20 # operations traced for allocations
+THRESHOLD = 0.25 # allowed relative regression
+ALLOCATION_SLACK_BYTES = 256 # absolute tolerance for tiny allocation figures
+ANOMALY_RATE = 0.1
+SEED = 42
+
+BENCHMARK_TOKEN_KID = "benchmark-key"
+BENCHMARK_APP_ID = "benchmark-client"
+
+class Benchmark:
+    def __init__(self, name: str, setup: Callable[[], Callable[[], object]], records: int = 1):
+        self.name = name
+        self.setup = setup
+        self.records = records
+
+class BenchmarkResult:
+    def __init__(self, name: str, ops_per_sec: float, records_per_sec: float, alloc_bytes_per_record: float):
+        self.name = name
+        self.ops_per_sec = ops_per_sec
+        self.records_per_sec = records_per_sec
+        self.alloc_bytes_per_record = alloc_bytes_per_record
+
+    def to_dict(self) -> dict:
+        return {
+            "ops_per_sec": round(self.ops_per_sec, 1),
+            "records_per_sec": round(self.records_per_sec, 1),
+            "alloc_bytes_per_record": round(self.alloc_bytes_per_record, 1),
+        }
+
+def install_fakes() -> None:
+    """Points the helpers at in-memory SNS and DynamoDB and sets the handler configuration."""
+    import helpers.dynamo_db
+    import helpers.sns_common
+
+    os.environ.update({
+        "SNS_TOPIC_ARN": f"{ARN_PREFIX}sns-sensors-ingress",
+        "SNS_ABNORMAL_LOW_TOPIC_ARN": f"{ARN_PREFIX}sns-sensors-abnormal-lo",
+        "SNS_ABNORMAL_HIGH_TOPIC_ARN": f"{ARN_PREFIX}sns-sensors-abnormal-hi",
+        "COGNITO_USER_POOL_ID": "il-central-1_benchmark",
+        "COGNITO_USER_POOL_CLIENT_ID": BENCHMARK_APP_ID,
+    })
+    dynamodb = FakeDynamoDBResource()
+    parameters_table = dynamodb.add_table(PARAMETERS_TABLE, ("sensor_id",))
+    for item in default_params:
+        parameters_table.put_item(Item=dict(item))
+    helpers.sns_common.sns_client.clients = {os.environ["AWS_REGION"]: FakeSNSClient()}
+    helpers.dynamo_db._dynamodb_resource = dynamodb
+    helpers.dynamo_db._dynamodb_tables.clear()
+
+def sensor_readings(n_readings: int, random_generator: random.Random) -> list[dict]:
+    readings = []
+    max_values = {item["sensor_id"]: item["max_value"] for item in default_params}
+    for i in range(n_readings):
+        reading = random_generator.choice(SENSORS).get_sensor_data(random_generator)
+        if random_generator.random() < ANOMALY_RATE:
+            reading["value"] = max_values[reading["sensor_id"]] + random_generator.randint(1, 10)
+        reading["package_id"] = f"package-{i}"
+        readings.append(reading)
+    return readings
+
+def sqs_records(readings: list[dict]) -> list[dict]:
+    return [
+        {
+            "messageId": f"message-{i}",
+            "body": json.dumps(reading),
+            "attributes": {"SentTimestamp": str(int(time.time() * 1000))},
+            "messageAttributes": {},
+            "eventSource": "aws:sqs",
+        }
+        for i, reading in enumerate(readings)
+    ]
+
+def alert_records(readings: list[dict]) -> list[dict]:
+    return sqs_records([
+        {**reading, "deviation": 1, "alert_type": "high" if i % 2 else "low"}
+        for i, reading in enumerate(readings)
+    ])
+
+def setup_ingress_parse() -> Callable[[], object]:
+    from ingress_helpers import build_sns_message, get_request_body
+    reading = sensor_readings(1, random.Random(SEED))[0]
+    reading.pop("package_id")
+    event = {"path": "/api/v1/sensors", "httpMethod": "POST", "body": json.dumps(reading)}
+    return lambda: build_sns_message(get_request_body(event))
+
+def setup_ingress_auth() -> Callable[[], object]:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk, jwt
+    import cognito_auth
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": BENCHMARK_TOKEN_KID, "alg": "RS256"}
+    token = jwt.encode(
+        {
+            "iss": cognito_auth.get_auth_config("cognito_issuer"),
+            "token_use": "access",
+            "client_id": BENCHMARK_APP_ID,
+            "exp": int(time.time()) + 3600,
+        },
+        private_pem.decode("utf-8"),
+        algorithm="RS256",
+        headers={"kid": BENCHMARK_TOKEN_KID},
+    )
+    # keys are fetched once and then served from the JWKS cache
+    cognito_auth._fetch_cognito_keys = lambda: [public_jwk]
+    cognito_auth._cognito_keys.clear()
+    cognito_auth._cognito_keys_fetched_at = None
+    event = {"headers": {"authorization": f"{cognito_auth.AUTH_TOKEN_PREFIX}{token}"}}
+    return lambda: cognito_auth.get_user_token(event)
+
+def disable_deduplication(module) -> None:
+    """Benchmarks replay the same packages, which would otherwise be skipped as duplicates."""
+    from helpers.dedup import Deduplicator
+    module.deduplicator = Deduplicator(module.deduplicator.scope, max_entries=0, table_name="")
+
+def setup_abnormal_record() -> Callable[[], object]:
+    import sensors_abnormal
+    disable_deduplication(sensors_abnormal)
+    readings = sensor_readings(1, random.Random(SEED))
+    readings[0].update(sensor_id=default_params[0]["sensor_id"], value=default_params[0]["min_value"])
+    record = sqs_records(readings)[0]
+    return lambda: sensors_abnormal.process_record(record)
+
+def setup_abnormal_handler(batch_size: int) -> Callable[[], Callable[[], object]]:
+    def setup() -> Callable[[], object]:
+        import sensors_abnormal
+        disable_deduplication(sensors_abnormal)
+        event = {"Records": sqs_records(sensor_readings(batch_size, random.Random(SEED)))}
+        return lambda: sensors_abnormal.lambda_handler(event, None)
+    return setup
+
+def setup_avg_handler(batch_size: int) -> Callable[[], Callable[[], object]]:
+    def setup() -> Callable[[], object]:
+        import sensors_avg
+        disable_deduplication(sensors_avg)
+        event = {"Records": sqs_records(sensor_readings(batch_size, random.Random(SEED)))}
+        return lambda: sensors_avg.lambda_handler(event, None)
+    return setup
+
+def setup_alert_sink(batch_size: int) -> Callable[[], Callable[[], object]]:
+    def setup() -> Callable[[], object]:
+        import sensors_alert_sink
+        records = alert_records(sensor_readings(batch_size, random.Random(SEED)))
+        def op() -> bytes:
+            aggregates = list(sensors_alert_sink.aggregate_alerts(records).values())
+            return sensors_alert_sink.build_alerts_object(aggregates, time.time())
+        return op
+    return setup
+
+BENCHMARKS = [
+    Benchmark("ingress_parse", setup_ingress_parse),
+    Benchmark("ingress_auth_cached_keys", setup_ingress_auth),
+    Benchmark("abnormal_process_record", setup_abnormal_record),
+    *(Benchmark(f"abnormal_handler_b{n}", setup_abnormal_handler(n), n) for n in (1, 10, 100)),
+    *(Benchmark(f"avg_handler_b{n}", setup_avg_handler(n), n) for n in (10, 100)),
+    *(Benchmark(f"alert_sink_b{n}", setup_alert_sink(n), n) for n in (10, 500)),
+]
+
+def measure(benchmark: Benchmark, min_seconds: float) -> BenchmarkResult:
+    op = benchmark.setup()
+    for _ in range(WARMUP_OPS):
+        op()
+
+    # best round, like timeit, to filter out scheduler and frequency noise
+    ops_per_sec = 0.0
+    for _ in range(ROUNDS):
+        ops = 0
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < min_seconds / ROUNDS:
+            op()
+            ops += 1
+        ops_per_sec = max(ops_per_sec, ops / elapsed)
+
+    # peak traced bytes of each operation above what was allocated before it
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOCATION_OPS):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            op()
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        benchmark.name,
+        ops_per_sec,
+        ops_per_sec * benchmark.records,
+        allocated / ALLOCATION_OPS / benchmark.records,
+    )
+
+def find_regressions(result: BenchmarkResult, baseline: dict, threshold: float, check_throughput: bool) -> list[str]:
+    regressions = []
+    if check_throughput and result.ops_per_sec < baseline["ops_per_sec"] * (1 - threshold):
+        regressions.append(f"ops/sec {result.ops_per_sec:.1f} < baseline {baseline['ops_per_sec']:.1f}")
+    allowed_bytes = baseline["alloc_bytes_per_record"] * (1 + threshold) + ALLOCATION_SLACK_BYTES
+    if result.alloc_bytes_per_record > allowed_bytes:
+        regressions.append(
+            f"bytes/record {result.alloc_bytes_per_record:.1f} > baseline {baseline['alloc_bytes_per_record']:.1f}"
+        )
+    return regressions
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the sensors handler hot paths with mocked AWS")
+    parser.add_argument("names", nargs="*", help="Benchmarks to run, all if omitted")
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS, help="Measuring time per benchmark")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Allowed relative regression, e.g. 0.25")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="Path of the baselines JSON")
+    parser.add_argument("--update-baselines", action="store_true", help="Write the results as the new baselines")
+    parser.add_argument("--skip-throughput", action="store_true", help="Compare allocations only (different hardware)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    install_fakes()
+    benchmarks = [b for b in BENCHMARKS if not args.names or b.name in args.names]
+    baselines: dict = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f).get("benchmarks", {})
+
+    results = []
+    failed = False
+    for benchmark in benchmarks:
+        result = measure(benchmark, args.min_seconds)
+        results.append(result)
+        regressions = []
+        if not args.update_baselines and benchmark.name in baselines:
+            regressions = find_regressions(result, baselines[benchmark.name], args.threshold, not args.skip_throughput)
+        failed = failed or bool(regressions)
+        logger.info(
+            "%-26s %12.1f ops/s %12.1f records/s %10.1f B/record %s",
+            result.name, result.ops_per_sec, result.records_per_sec, result.alloc_bytes_per_record,
+            "REGRESSION: " + "; ".join(regressions) if regressions else "",
+        )
+
+    if args.update_baselines:
+        baselines.update({result.name: result.to_dict() for result in results})
+        with open(args.baselines, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "benchmarks": baselines}, f, indent=2)
+            f.write("\n")
+        logger.info("Baselines written to %s", args.baselines)
+    sys.exit(1 if failed else 0)
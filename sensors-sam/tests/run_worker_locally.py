@@ -0,0 +1,68 @@
+"""
+Runs the long-running SQS worker offline: readings are sent to a LocalQueue
+stand-in, the poller runs the consumer handler against the in-memory SNS and
+DynamoDB fakes, and the run reports throughput, deletes and dead letters.
+
+    python run_worker_locally.py --consumer avg --readings 20000 --pollers 4
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+SAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(SAM_DIR, "workers", "sensors-poller", "src"))
+
+from run_benchmarks import install_fakes, sensor_readings, SEED
+from local_queue import LocalQueue
+from sensors_poller import CONSUMERS, SQSPoller, get_handler
+
+logger = logging.getLogger("run_worker_locally")
+logger.setLevel(logging.INFO)
+
+QUEUE_URL = "https://sqs.il-central-1.amazonaws.com/000000000000/sqs-sensors-local"
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the SQS worker against a local queue and in-memory AWS fakes")
+    parser.add_argument("--consumer", choices=sorted(CONSUMERS), default="abnormal")
+    parser.add_argument("--readings", type=int, default=10000, help="Readings sent to the queue")
+    parser.add_argument("--pollers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--batch-window", type=float, default=0.2)
+    parser.add_argument("--visibility-timeout", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for the queue to drain")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    install_fakes()
+    local_queue = LocalQueue(visibility_timeout=args.visibility_timeout)
+    for reading in sensor_readings(args.readings, random.Random(SEED)):
+        local_queue.send_message(QueueUrl=QUEUE_URL, MessageBody=json.dumps(reading))
+
+    poller = SQSPoller(
+        local_queue,
+        QUEUE_URL,
+        get_handler(args.consumer),
+        pollers=args.pollers,
+        batch_size=args.batch_size,
+        batch_window=args.batch_window,
+        wait_seconds=1,
+        visibility_timeout=args.visibility_timeout,
+    )
+    start = time.perf_counter()
+    poller.start()
+    deadline = time.monotonic() + args.timeout
+    while local_queue.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    poller.stop()
+    logger.info(
+        "%s: %d readings in %.2fs (%.0f/s), %d deleted, %d failed, %d pending, %d dead letters",
+        args.consumer, args.readings, elapsed, args.readings / elapsed, local_queue.deleted,
+        poller.failed, local_queue.pending(), len(local_queue.dead_letters),
+    )
+    sys.exit(1 if local_queue.pending() or local_queue.dead_letters else 0)
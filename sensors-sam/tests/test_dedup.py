@@ -0,0 +1,52 @@
+import json
+import pytest
+from helpers.dedup import ClaimInProgressError, Deduplicator, STATE_COMPLETED
+from conftest import get_consumer
+
+DEDUP_TABLE = "sensors-dedup"
+
+def reading(package_id: str) -> dict:
+    return {"sensor_id": "101", "value": 50, "timestamp": 1700000000.0, "package_id": package_id}
+
+def test_claimed_package_is_retried_until_released(pipeline, monkeypatch):
+    import sensors_abnormal
+    table = pipeline.dynamodb.add_table(DEDUP_TABLE, ("dedup_key",))
+    monkeypatch.setattr(sensors_abnormal, "deduplicator", Deduplicator("abnormal", table_name=DEDUP_TABLE))
+    other_container = Deduplicator("abnormal", table_name=DEDUP_TABLE)
+    consumer = get_consumer(pipeline, "abnormal")
+
+    assert other_container.claim("package-1")
+    consumer.queue.send(json.dumps(reading("package-1")))
+    consumer.invoke()
+    # the conflicting delivery is not acknowledged while the claim is in progress
+    assert len(consumer.queue.messages) == 1
+
+    other_container.release("package-1")
+    pipeline.clock.now += consumer.queue.visibility_timeout
+    consumer.invoke()
+    assert not consumer.queue.messages
+    assert table.items[("abnormal#package-1",)]["claim_state"] == STATE_COMPLETED
+
+def test_completed_package_is_skipped(pipeline):
+    pipeline.dynamodb.add_table(DEDUP_TABLE, ("dedup_key",))
+    first, second = Deduplicator("avg", table_name=DEDUP_TABLE), Deduplicator("avg", table_name=DEDUP_TABLE)
+    assert first.claim("package-1")
+    first.complete("package-1")
+    assert not second.claim("package-1")
+    assert not first.claim("package-1")
+
+def test_package_claimed_in_this_container_is_in_progress():
+    deduplicator = Deduplicator("avg", table_name="")
+    assert deduplicator.claim("package-1")
+    with pytest.raises(ClaimInProgressError):
+        deduplicator.claim("package-1")
+    deduplicator.release("package-1")
+    assert deduplicator.claim("package-1")
+
+def test_disabled_deduplicator_keeps_no_state():
+    deduplicator = Deduplicator("avg", max_entries=0, table_name="")
+    assert deduplicator.claim("package-1")
+    assert deduplicator.claim("package-1")
+    deduplicator.complete_many(["package-1"])
+    assert deduplicator.claim("package-1")
+    assert not deduplicator._claimed and not deduplicator._completed
@@ -0,0 +1,40 @@
+import json
+import time
+from helpers.online_detector import OnlineDetector
+from local_pipeline import ABNORMAL_HIGH_TOPIC, PARAMETERS_TABLE, FakeQueue
+from conftest import get_consumer
+
+def test_retry_after_failed_detection_publish_skips_published_limit_alert(pipeline, monkeypatch):
+    import sensors_abnormal
+    monkeypatch.setattr(sensors_abnormal, "DETECTOR_ENABLED", True)
+    monkeypatch.setattr(sensors_abnormal, "_detector", OnlineDetector())
+    monkeypatch.setattr(sensors_abnormal, "_detector_saved_at", time.monotonic())
+    monkeypatch.setattr(sensors_abnormal, "_detector_configs", {})
+    pipeline.dynamodb.Table(PARAMETERS_TABLE).put_item(Item={
+        "sensor_id": "901", "min_value": 0, "max_value": 10, "detectors": "stuck", "stuck_readings": 2,
+    })
+    high_queue = FakeQueue("sqs-high", pipeline.clock, 30, 5)
+    pipeline.sns.subscribe(pipeline.arn(ABNORMAL_HIGH_TOPIC), high_queue)
+    publish = pipeline.sns.publish
+    failures = {"stuck": 1}
+
+    def failing_publish(TopicArn: str, Message: str, **kwargs) -> dict:
+        alert_type = json.loads(Message).get("alert_type")
+        if failures.get(alert_type):
+            failures[alert_type] -= 1
+            raise RuntimeError(f"{alert_type} publish failed")
+        return publish(TopicArn=TopicArn, Message=Message, **kwargs)
+
+    monkeypatch.setattr(pipeline.sns, "publish", failing_publish)
+    consumer = get_consumer(pipeline, "abnormal")
+    for i in range(2):
+        consumer.queue.send(json.dumps({"sensor_id": "901", "value": 20, "timestamp": 1700000000.0 + i, "package_id": f"package-{i}"}))
+        consumer.invoke()
+    # the limit alert of package-1 went out before its stuck alert failed
+    assert len(consumer.queue.messages) == 1
+
+    pipeline.clock.now += consumer.queue.visibility_timeout
+    consumer.invoke()
+    assert not consumer.queue.messages
+    alerts = [(body["package_id"], body["alert_type"]) for body in (json.loads(m["body"]) for m in high_queue.messages.values())]
+    assert alerts == [("package-0", "high"), ("package-1", "high"), ("package-1", "stuck")]
@@ -0,0 +1,23 @@
+import json
+from local_pipeline import AVERAGE_TOPIC, FakeQueue
+from conftest import get_consumer
+
+def test_one_average_message_per_reading(pipeline):
+    average_queue = FakeQueue("sqs-average", pipeline.clock, 30, 5)
+    pipeline.sns.subscribe(pipeline.arn(AVERAGE_TOPIC), average_queue)
+    consumer = get_consumer(pipeline, "avg")
+    readings = [
+        {"sensor_id": "101", "value": 50, "timestamp": 1700000000.0, "package_id": "package-1"},
+        {"sensor_id": "101", "value": 52, "timestamp": 1700000001.0, "package_id": "package-2"},
+        {"sensor_id": "102", "value": 60, "timestamp": 1700000001.0, "package_id": "package-3"},
+    ]
+    for reading in readings:
+        consumer.queue.send(json.dumps(reading))
+    consumer.invoke()
+
+    assert not consumer.queue.messages
+    messages = [json.loads(message["body"]) for message in average_queue.messages.values()]
+    assert messages == [
+        {"type": "average", "original_data": reading, "processed_by": "sensors-avg-lambda"}
+        for reading in readings
+    ]
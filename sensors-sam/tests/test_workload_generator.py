@@ -0,0 +1,25 @@
+import numpy as np
+from workload_generator import WorkloadConfig, WorkloadGenerator, get_fleet, parse_args, workload_config_from_args
+
+FAILURE_BURST_ARGS = [
+    "synthetic:50", "--seed", "7",
+    "--failure-probability", "1", "--failure-seconds", "60", "--failure-scale", "5",
+    "--spike-probability", "0", "--drift-fraction", "0", "--stuck-fraction", "0",
+]
+
+def test_failure_scale_defaults_to_config():
+    assert workload_config_from_args(parse_args(["synthetic:10"])).failure_scale == WorkloadConfig().failure_scale
+
+def test_failure_scale_from_cli_offsets_failed_groups():
+    args = parse_args(FAILURE_BURST_ARGS)
+    config = workload_config_from_args(args)
+    assert config.failure_scale == 5.0
+
+    fleet = get_fleet(args.fleet, np.random.default_rng(args.seed))
+    generator = WorkloadGenerator(fleet, config, args.seed)
+    batch = generator.next_batch()
+    assert len(batch)
+    min_values, max_values = fleet.min_values[batch.sensor_indexes], fleet.max_values[batch.sensor_indexes]
+    widths = max_values - min_values + 1
+    # every group fails at once, 5 range widths away from its normal range
+    assert np.all((batch.values >= max_values + 3 * widths) | (batch.values <= min_values - 3 * widths))
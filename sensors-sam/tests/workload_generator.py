@@ -0,0 +1,267 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import time
+import logging
+from typing import Iterator, Optional
+import numpy as np
+from create_data_stream import API_PATH, default_params
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+logging.basicConfig(
+    format=LOG_FORMAT,
+    level=logging.WARNING,
+)
+logger = logging.getLogger("workload_generator")
+logger.setLevel(logging.INFO)
+
+SYNTHETIC_PREFIX = "synthetic:" # synthetic:<n_sensors> instead of a parameter file
+SENSOR_RATE = 0.1 # readings per second per sensor
+RATE_SPREAD = 0.5 # sigma of the lognormal spread of the per-sensor rates
+BATCH_SECONDS = 1.0
+DURATION_SECONDS = 60.0
+
+class Fleet:
+    """Sensor parameters as column arrays indexed by sensor position."""
+    def __init__(self, sensor_ids: list[str], min_values: np.ndarray, max_values: np.ndarray, rates: Optional[np.ndarray] = None):
+        self.sensor_ids = np.asarray(sensor_ids, dtype=object)
+        self.min_values = np.asarray(min_values, dtype=np.int64)
+        self.max_values = np.asarray(max_values, dtype=np.int64)
+        self.rates = None if rates is None else np.asarray(rates, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.sensor_ids)
+
+    def to_parameters(self) -> list[dict]:
+        return [
+            {"sensor_id": sensor_id, "min_value": int(min_value), "max_value": int(max_value)}
+            for sensor_id, min_value, max_value in zip(self.sensor_ids, self.min_values, self.max_values)
+        ]
+
+def fleet_from_items(items: list[dict]) -> Fleet:
+    rates = [float(item["rate"]) for item in items] if items and all(item.get("rate") for item in items) else None
+    return Fleet(
+        [str(item["sensor_id"]) for item in items],
+        np.array([int(item["min_value"]) for item in items]),
+        np.array([int(item["max_value"]) for item in items]),
+        None if rates is None else np.array(rates),
+    )
+
+def load_fleet(path: str) -> Fleet:
+    """Loads sensor_id, min_value, max_value and optional rate from a .json, .ndjson or .csv file."""
+    with open(path) as f:
+        if path.endswith(".csv"):
+            items = list(csv.DictReader(f))
+        elif path.endswith(".ndjson"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    return fleet_from_items(items)
+
+def synthesize_fleet(n_sensors: int, rng: np.random.Generator) -> Fleet:
+    """Builds a fleet whose normal ranges are drawn around the ranges of default_params."""
+    templates = fleet_from_items(default_params)
+    template_index = rng.integers(0, len(templates), n_sensors)
+    shift = rng.integers(-10, 11, n_sensors)
+    width = templates.max_values[template_index] - templates.min_values[template_index]
+    min_values = templates.min_values[template_index] + shift
+    max_values = min_values + np.maximum(1, (width * rng.uniform(0.8, 1.2, n_sensors)).astype(np.int64))
+    return Fleet([f"sensor-{i:06d}" for i in range(n_sensors)], min_values, max_values)
+
+def get_fleet(source: str, rng: np.random.Generator) -> Fleet:
+    if source.startswith(SYNTHETIC_PREFIX):
+        return synthesize_fleet(int(source.removeprefix(SYNTHETIC_PREFIX)), rng)
+    return load_fleet(source)
+
+class WorkloadConfig:
+    def __init__(
+            self,
+            sensor_rate: float = SENSOR_RATE,
+            rate_spread: float = RATE_SPREAD,
+            drift_fraction: float = 0.05, # sensors drifting away from their normal range
+            drift_per_hour: float = 0.5, # drift in normal range widths per hour
+            spike_probability: float = 0.01, # per reading
+            spike_scale: float = 1.5, # spike size in normal range widths
+            stuck_fraction: float = 0.01, # sensors reporting a constant value
+            group_size: int = 100, # sensors failing together
+            failure_probability: float = 0.001, # per group and second
+            failure_seconds: float = 30.0,
+            failure_scale: float = 1.0, # failure offset in normal range widths
+        ):
+        self.sensor_rate = sensor_rate
+        self.rate_spread = rate_spread
+        self.drift_fraction = drift_fraction
+        self.drift_per_hour = drift_per_hour
+        self.spike_probability = spike_probability
+        self.spike_scale = spike_scale
+        self.stuck_fraction = stuck_fraction
+        self.group_size = group_size
+        self.failure_probability = failure_probability
+        self.failure_seconds = failure_seconds
+        self.failure_scale = failure_scale
+
+class ReadingBatch:
+    def __init__(self, offsets: np.ndarray, sensor_indexes: np.ndarray, values: np.ndarray):
+        self.offsets = offsets
+        self.sensor_indexes = sensor_indexes
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+class WorkloadGenerator:
+    """
+    Generates readings of a whole fleet per time slice with NumPy: Poisson
+    arrivals at per-sensor rates, uniform normal values plus drift, spikes,
+    stuck-at sensors and correlated group failures.
+    """
+    def __init__(self, fleet: Fleet, config: WorkloadConfig, seed: Optional[int] = None):
+        self.fleet = fleet
+        self.config = config
+        self.rng = np.random.default_rng(seed)
+        n_sensors = len(fleet)
+        self.widths = fleet.max_values - fleet.min_values + 1
+        if fleet.rates is not None:
+            self.rates = fleet.rates
+        else:
+            self.rates = config.sensor_rate * self.rng.lognormal(-config.rate_spread ** 2 / 2, config.rate_spread, n_sensors)
+        drifting = self.rng.random(n_sensors) < config.drift_fraction
+        direction = self.rng.choice([-1.0, 1.0], n_sensors)
+        self.drift_per_second = drifting * direction * self.widths * config.drift_per_hour / 3600
+        self.stuck = self.rng.random(n_sensors) < config.stuck_fraction
+        self.stuck_values = self.rng.integers(fleet.min_values, fleet.max_values + 1)
+        self.groups = np.arange(n_sensors) // max(1, config.group_size)
+        n_groups = int(self.groups[-1]) + 1 if n_sensors else 0
+        self.failed_until = np.full(n_groups, -np.inf)
+        self.failure_direction = np.ones(n_groups)
+        self.elapsed = 0.0
+
+    def _update_failures(self, batch_seconds: float) -> None:
+        config = self.config
+        starting = self.rng.random(len(self.failed_until)) < config.failure_probability * batch_seconds
+        starting &= self.failed_until <= self.elapsed
+        self.failed_until[starting] = self.elapsed + config.failure_seconds
+        self.failure_direction[starting] = self.rng.choice([-1.0, 1.0], int(starting.sum()))
+
+    def next_batch(self, batch_seconds: float = BATCH_SECONDS) -> ReadingBatch:
+        config = self.config
+        self._update_failures(batch_seconds)
+        counts = self.rng.poisson(self.rates * batch_seconds)
+        sensor_indexes = np.repeat(np.arange(len(self.fleet)), counts)
+        offsets = self.elapsed + self.rng.uniform(0.0, batch_seconds, len(sensor_indexes))
+        order = np.argsort(offsets, kind="stable")
+        offsets, sensor_indexes = offsets[order], sensor_indexes[order]
+
+        min_values, widths = self.fleet.min_values[sensor_indexes], self.widths[sensor_indexes]
+        values = min_values + self.rng.random(len(sensor_indexes)) * widths
+        values += self.drift_per_second[sensor_indexes] * offsets
+        spikes = self.rng.random(len(sensor_indexes)) < config.spike_probability
+        values[spikes] += self.rng.choice([-1.0, 1.0], int(spikes.sum())) * config.spike_scale * widths[spikes]
+        groups = self.groups[sensor_indexes]
+        failed = self.failed_until[groups] > offsets
+        values[failed] += self.failure_direction[groups[failed]] * config.failure_scale * widths[failed]
+        values = np.floor(values).astype(np.int64)
+        stuck = self.stuck[sensor_indexes]
+        values[stuck] = self.stuck_values[sensor_indexes[stuck]]
+
+        self.elapsed += batch_seconds
+        return ReadingBatch(offsets, sensor_indexes, values)
+
+    def batches(self, duration: float, batch_seconds: float = BATCH_SECONDS) -> Iterator[ReadingBatch]:
+        while self.elapsed < duration:
+            yield self.next_batch(min(batch_seconds, duration - self.elapsed))
+
+    def arrivals(self, duration: float, batch_seconds: float = BATCH_SECONDS, start: Optional[float] = None) -> Iterator[tuple[float, dict]]:
+        """Yields (offset_seconds, reading) for the load generator and the local pipeline."""
+        start = time.time() if start is None else start
+        sensor_ids = self.fleet.sensor_ids
+        for batch in self.batches(duration, batch_seconds):
+            for offset, sensor_index, value in zip(batch.offsets.tolist(), batch.sensor_indexes.tolist(), batch.values.tolist()):
+                yield offset, {"sensor_id": sensor_ids[sensor_index], "value": value, "timestamp": start + offset}
+
+def write_capture_files(generator: WorkloadGenerator, output_dir: str, duration: float, batch_seconds: float) -> int:
+    """Writes one gzip NDJSON file per batch in the capture format read by replay_traffic."""
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.time()
+    sensor_ids = generator.fleet.sensor_ids
+    written = 0
+    for batch_number, batch in enumerate(generator.batches(duration, batch_seconds)):
+        lines = [
+            json.dumps({
+                "captured_at": start + offset,
+                "source": "ingress",
+                "event": {
+                    "path": API_PATH,
+                    "httpMethod": "POST",
+                    "body": json.dumps({"sensor_id": sensor_ids[sensor_index], "value": value, "timestamp": start + offset}),
+                },
+            }, separators=(",", ":"))
+            for offset, sensor_index, value in zip(batch.offsets.tolist(), batch.sensor_indexes.tolist(), batch.values.tolist())
+        ]
+        with open(os.path.join(output_dir, f"workload-{batch_number:06d}.ndjson.gz"), "wb") as f:
+            f.write(gzip.compress(("\n".join(lines) + "\n").encode("utf-8")))
+        written += len(lines)
+    return written
+
+def add_workload_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = WorkloadConfig()
+    group = parser.add_argument_group("workload")
+    group.add_argument("--sensor-rate", type=float, default=defaults.sensor_rate, help="Mean readings per second per sensor")
+    group.add_argument("--rate-spread", type=float, default=defaults.rate_spread, help="Lognormal sigma of the per-sensor rates")
+    group.add_argument("--drift-fraction", type=float, default=defaults.drift_fraction, help="Fraction of drifting sensors")
+    group.add_argument("--drift-per-hour", type=float, default=defaults.drift_per_hour, help="Drift in normal range widths per hour")
+    group.add_argument("--spike-probability", type=float, default=defaults.spike_probability, help="Spike probability per reading")
+    group.add_argument("--spike-scale", type=float, default=defaults.spike_scale, help="Spike size in normal range widths")
+    group.add_argument("--stuck-fraction", type=float, default=defaults.stuck_fraction, help="Fraction of stuck-at sensors")
+    group.add_argument("--group-size", type=int, default=defaults.group_size, help="Sensors per correlated failure group")
+    group.add_argument("--failure-probability", type=float, default=defaults.failure_probability, help="Failure probability per group and second")
+    group.add_argument("--failure-seconds", type=float, default=defaults.failure_seconds, help="Duration of a group failure")
+    group.add_argument("--failure-scale", type=float, default=defaults.failure_scale, help="Group failure offset in normal range widths")
+    group.add_argument("--batch-seconds", type=float, default=BATCH_SECONDS, help="Generated time slice per batch")
+
+def workload_config_from_args(args: argparse.Namespace) -> WorkloadConfig:
+    return WorkloadConfig(
+        sensor_rate=args.sensor_rate,
+        rate_spread=args.rate_spread,
+        drift_fraction=args.drift_fraction,
+        drift_per_hour=args.drift_per_hour,
+        spike_probability=args.spike_probability,
+        spike_scale=args.spike_scale,
+        stuck_fraction=args.stuck_fraction,
+        group_size=args.group_size,
+        failure_probability=args.failure_probability,
+        failure_seconds=args.failure_seconds,
+        failure_scale=args.failure_scale,
+    )
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Vectorized synthetic workload generator for large sensor fleets")
+    parser.add_argument("fleet", help=f"Sensor parameter file (.json, .ndjson, .csv) or {SYNTHETIC_PREFIX}<n_sensors>")
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS, help="Generated seconds of traffic")
+    parser.add_argument("--output-dir", help="Write capture-format files here instead of a summary")
+    parser.add_argument("--parameters", help="Also write the fleet sensor parameters as NDJSON to this path")
+    parser.add_argument("--seed", type=int, help="Random seed")
+    add_workload_arguments(parser)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+    fleet = get_fleet(args.fleet, rng)
+    generator = WorkloadGenerator(fleet, workload_config_from_args(args), args.seed)
+    if args.parameters:
+        with open(args.parameters, "w") as f:
+            f.writelines(json.dumps(item) + "\n" for item in fleet.to_parameters())
+    start = time.perf_counter()
+    if args.output_dir:
+        n_readings = write_capture_files(generator, args.output_dir, args.duration, args.batch_seconds)
+    else:
+        n_readings = sum(len(batch) for batch in generator.batches(args.duration, args.batch_seconds))
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "%d readings of %d sensors over %.0fs generated in %.2fs (%.0f readings/s)",
+        n_readings, len(fleet), args.duration, elapsed, elapsed and n_readings / elapsed,
+    )
@@ -0,0 +1,68 @@
+"""
+Exports the sensor-parameters table (or a parameters file) into the binary
+limits snapshot read by helpers.limits_snapshot. Run before `sam build` so the
+snapshot ships in the helpers layer:
+
+    python tools/export_limits_snapshot/app.py --table sensor-parameters
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+
+import boto3
+
+SAM_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(SAM_DIR, "layers", "helpers", "python"))
+
+from helpers.limits_snapshot import DEFAULT_SNAPSHOT_PATH, LimitsSnapshot, write_snapshot
+
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s %(message)s", level=logging.INFO)
+logger = logging.getLogger("export_limits_snapshot")
+
+DEFAULT_TABLE_NAME = "sensor-parameters"
+
+def scan_table(table_name: str) -> list[dict]:
+    table = boto3.resource("dynamodb").Table(table_name)
+    items: list[dict] = []
+    scan_kwargs = {"ProjectionExpression": "sensor_id, min_value, max_value"}
+    while True:
+        response = table.scan(**scan_kwargs)
+        items.extend(response.get("Items", []))
+        if "LastEvaluatedKey" not in response:
+            return items
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def read_file(path: str) -> list[dict]:
+    with open(path) as f:
+        if path.endswith(".csv"):
+            return list(csv.DictReader(f))
+        if path.endswith((".ndjson", ".jsonl")):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def to_limits(items: list[dict]) -> dict[str, tuple[int, int]]:
+    limits = {}
+    for item in items:
+        try:
+            limits[str(item["sensor_id"])] = (int(item["min_value"]), int(item["max_value"]))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Skipping sensor parameters %s: %s", item, e)
+    return limits
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export sensor limits into a memory-mappable snapshot")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--table", default=DEFAULT_TABLE_NAME, help="DynamoDB sensor parameters table")
+    source.add_argument("--source", help="Sensor parameters file (.csv, .json, .ndjson) instead of the table")
+    parser.add_argument("--output", default=DEFAULT_SNAPSHOT_PATH, help="Snapshot path")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    limits = to_limits(read_file(args.source) if args.source else scan_table(args.table))
+    size = write_snapshot(args.output, limits)
+    snapshot = LimitsSnapshot.open(args.output)
+    logger.info("Snapshot version %d of %d sensors (%d bytes) written to %s", snapshot.version, len(snapshot), size, args.output)
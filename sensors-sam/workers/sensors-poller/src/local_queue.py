@@ -0,0 +1,99 @@
+import threading
+import time
+import uuid
+from collections import deque
+
+class LocalQueue:
+    """
+    In-memory stand-in for the SQS client calls used by the poller, for
+    running the worker offline: long polling, visibility timeouts and
+    batch deletes and visibility changes. Messages received max_receive_count
+    times without being deleted are moved to dead_letters.
+    """
+    def __init__(self, visibility_timeout: int = 30, max_receive_count: int = 5):
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.dead_letters: list[dict] = []
+        self.deleted = 0
+        self._condition = threading.Condition()
+        self._ready: deque[dict] = deque()
+        self._in_flight: dict[str, tuple[dict, float]] = {}
+
+    def send_message(self, QueueUrl: str, MessageBody: str, MessageAttributes: dict | None = None) -> dict:
+        message = {
+            "MessageId": str(uuid.uuid4()),
+            "Body": MessageBody,
+            "Attributes": {"SentTimestamp": str(int(time.time() * 1000)), "ApproximateReceiveCount": "0"},
+            "MessageAttributes": MessageAttributes or {},
+        }
+        with self._condition:
+            self._ready.append(message)
+            self._condition.notify()
+        return {"MessageId": message["MessageId"]}
+
+    def _expire_in_flight(self, now: float) -> None:
+        for receipt_handle, (message, visible_at) in list(self._in_flight.items()):
+            if visible_at <= now:
+                del self._in_flight[receipt_handle]
+                if int(message["Attributes"]["ApproximateReceiveCount"]) >= self.max_receive_count:
+                    self.dead_letters.append(message)
+                else:
+                    self._ready.append(message)
+
+    def receive_message(
+            self,
+            QueueUrl: str,
+            MaxNumberOfMessages: int = 1,
+            WaitTimeSeconds: int = 0,
+            VisibilityTimeout: int | None = None,
+            **kwargs,
+        ) -> dict:
+        deadline = time.monotonic() + WaitTimeSeconds
+        visibility_timeout = self.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._expire_in_flight(now)
+                if self._ready or now >= deadline:
+                    break
+                # wake up for in-flight messages becoming visible again
+                self._condition.wait(min(deadline - now, 0.1))
+            messages = []
+            while self._ready and len(messages) < MaxNumberOfMessages:
+                message = self._ready.popleft()
+                attributes = message["Attributes"]
+                attributes["ApproximateReceiveCount"] = str(int(attributes["ApproximateReceiveCount"]) + 1)
+                receipt_handle = str(uuid.uuid4())
+                self._in_flight[receipt_handle] = (message, now + visibility_timeout)
+                messages.append({**message, "ReceiptHandle": receipt_handle})
+        return {"Messages": messages} if messages else {}
+
+    def delete_message_batch(self, QueueUrl: str, Entries: list[dict]) -> dict:
+        successful, failed = [], []
+        with self._condition:
+            for entry in Entries:
+                if self._in_flight.pop(entry["ReceiptHandle"], None) is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True})
+                else:
+                    self.deleted += 1
+                    successful.append({"Id": entry["Id"]})
+        return {"Successful": successful, "Failed": failed}
+
+    def change_message_visibility_batch(self, QueueUrl: str, Entries: list[dict]) -> dict:
+        successful, failed = [], []
+        now = time.monotonic()
+        with self._condition:
+            for entry in Entries:
+                in_flight = self._in_flight.get(entry["ReceiptHandle"])
+                if in_flight is None:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True})
+                else:
+                    self._in_flight[entry["ReceiptHandle"]] = (in_flight[0], now + entry["VisibilityTimeout"])
+                    successful.append({"Id": entry["Id"]})
+            self._condition.notify_all()
+        return {"Successful": successful, "Failed": failed}
+
+    def pending(self) -> int:
+        """Messages not yet deleted or dead-lettered."""
+        with self._condition:
+            return len(self._ready) + len(self._in_flight)
@@ -0,0 +1,278 @@
+"""
+Long-running SQS worker running the abnormal or avg consumer outside Lambda.
+Several threads long-poll the queue, a dispatcher merges what they receive
+into batches of up to WORKER_BATCH_SIZE records for the unchanged
+lambda_handler of the consumer, successes are deleted with DeleteMessageBatch
+and the visibility of messages still in flight is extended. Failed records
+are left on the queue, as with the event source mapping, until its redrive
+policy (SqsMaxReceiveCount in template.yaml) moves them to the -dlq queue.
+Handler calls are serialized per process (the metrics buffer and caches are
+per process), so scale with WORKER_PROCESSES.
+
+    WORKER_CONSUMER=abnormal WORKER_QUEUE_URL=https://sqs... python sensors_poller.py
+"""
+import argparse
+import importlib
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from typing import Callable
+
+SAM_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# in the source tree the consumers and helpers are found next to the worker, in the image they are copied alongside it
+for source_dir in ["layers/helpers/python", "functions/sensors-abnormal-lambda/src", "functions/sensors-avg-lambda/src"]:
+    if os.path.isdir(os.path.join(SAM_DIR, source_dir)):
+        sys.path.insert(0, os.path.join(SAM_DIR, source_dir))
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+from helpers.logs import get_logger
+from helpers.config import get_region
+
+logger = get_logger("sensors-poller")
+
+CONSUMERS = {"abnormal": "sensors_abnormal", "avg": "sensors_avg"}
+
+WORKER_CONSUMER = os.getenv("WORKER_CONSUMER", default="abnormal")
+WORKER_QUEUE_URL = os.getenv("WORKER_QUEUE_URL", default="")
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", default="1"))
+WORKER_POLLERS = int(os.getenv("WORKER_POLLERS", default="4")) # concurrent ReceiveMessage loops per process
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", default="100")) # records per handler call
+WORKER_BATCH_WINDOW_SECONDS = float(os.getenv("WORKER_BATCH_WINDOW_SECONDS", default="1"))
+WORKER_WAIT_SECONDS = int(os.getenv("WORKER_WAIT_SECONDS", default="20")) # long polling, at most 20
+WORKER_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("WORKER_VISIBILITY_TIMEOUT_SECONDS", default="30"))
+SQS_MAX_MESSAGES = 10 # per ReceiveMessage, DeleteMessageBatch and ChangeMessageVisibilityBatch call
+
+def chunks(items: list, size: int = SQS_MAX_MESSAGES):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def to_lambda_record(message: dict) -> dict:
+    """SQS API message in the shape of an SQS event record of the event source mapping."""
+    return {
+        "messageId": message["MessageId"],
+        "receiptHandle": message["ReceiptHandle"],
+        "body": message.get("Body", ""),
+        "attributes": message.get("Attributes") or {},
+        "messageAttributes": {
+            name: {"stringValue": value.get("StringValue"), "dataType": value.get("DataType")}
+            for name, value in (message.get("MessageAttributes") or {}).items()
+        },
+        "eventSource": "aws:sqs",
+    }
+
+class InFlight:
+    """Received messages not yet deleted or released, with their visibility deadlines."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deadlines: dict[str, float] = {}
+
+    def add(self, receipt_handles: list[str], visibility_timeout: int) -> None:
+        deadline = time.monotonic() + visibility_timeout
+        with self._lock:
+            for receipt_handle in receipt_handles:
+                self._deadlines[receipt_handle] = deadline
+
+    def extend(self, receipt_handles: list[str], visibility_timeout: int) -> None:
+        """Moves the deadlines of the messages that are still in flight."""
+        deadline = time.monotonic() + visibility_timeout
+        with self._lock:
+            for receipt_handle in receipt_handles:
+                if receipt_handle in self._deadlines:
+                    self._deadlines[receipt_handle] = deadline
+
+    def remove(self, receipt_handles: list[str]) -> None:
+        with self._lock:
+            for receipt_handle in receipt_handles:
+                self._deadlines.pop(receipt_handle, None)
+
+    def expiring(self, within_seconds: float) -> list[str]:
+        limit = time.monotonic() + within_seconds
+        with self._lock:
+            return [receipt_handle for receipt_handle, deadline in self._deadlines.items() if deadline <= limit]
+
+class SQSPoller:
+    def __init__(
+            self,
+            sqs_client,
+            queue_url: str,
+            handler: Callable[[dict, object], dict],
+            pollers: int = WORKER_POLLERS,
+            batch_size: int = WORKER_BATCH_SIZE,
+            batch_window: float = WORKER_BATCH_WINDOW_SECONDS,
+            wait_seconds: int = WORKER_WAIT_SECONDS,
+            visibility_timeout: int = WORKER_VISIBILITY_TIMEOUT_SECONDS,
+        ):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+        self.handler = handler
+        self.pollers = pollers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.wait_seconds = wait_seconds
+        self.visibility_timeout = visibility_timeout
+        self.stopping = threading.Event()
+        self._dispatched = threading.Event()
+        self.in_flight = InFlight()
+        self.processed = 0
+        self.failed = 0
+        # bounded so that pollers stop receiving while the dispatcher is behind
+        self._received: queue.Queue[dict] = queue.Queue(maxsize=2 * batch_size)
+        self._threads: list[threading.Thread] = []
+
+    def poll(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                response = self.sqs_client.receive_message(
+                    QueueUrl=self.queue_url,
+                    MaxNumberOfMessages=SQS_MAX_MESSAGES,
+                    WaitTimeSeconds=self.wait_seconds,
+                    VisibilityTimeout=self.visibility_timeout,
+                    AttributeNames=["All"],
+                    MessageAttributeNames=["All"],
+                )
+            except (BotoCoreError, ClientError) as e:
+                logger.error("Error receiving messages: %s", e)
+                self.stopping.wait(1)
+                continue
+            messages = response.get("Messages", [])
+            self.in_flight.add([message["ReceiptHandle"] for message in messages], self.visibility_timeout)
+            for message in messages:
+                self._received.put(message)
+
+    def next_batch(self) -> list[dict]:
+        """Waits for a first message, then collects more until the batch is full or the window has passed."""
+        try:
+            batch = [self._received.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._received.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def process_batch(self, messages: list[dict]) -> None:
+        records = [to_lambda_record(message) for message in messages]
+        try:
+            response = self.handler({"Records": records}, None) or {}
+            failed_ids = {failure["itemIdentifier"] for failure in response.get("batchItemFailures", [])}
+        except Exception as e:
+            logger.error("Error processing batch of %d messages: %s", len(messages), e)
+            failed_ids = {message["MessageId"] for message in messages}
+        succeeded = [message for message in messages if message["MessageId"] not in failed_ids]
+        self.delete_messages(succeeded)
+        # failed messages become visible again after the visibility timeout, counting towards the redrive policy
+        self.in_flight.remove([message["ReceiptHandle"] for message in messages])
+        self.processed += len(succeeded)
+        self.failed += len(messages) - len(succeeded)
+
+    def delete_messages(self, messages: list[dict]) -> None:
+        for chunk in chunks(messages):
+            entries = [{"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]} for index, message in enumerate(chunk)]
+            try:
+                response = self.sqs_client.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            except (BotoCoreError, ClientError) as e:
+                logger.error("Error deleting %d messages: %s", len(entries), e)
+                continue
+            for failure in response.get("Failed", []):
+                logger.error("Error deleting message %s: %s", chunk[int(failure["Id"])]["MessageId"], failure.get("Code"))
+
+    def dispatch(self) -> None:
+        while not (self.stopping.is_set() and self._received.empty() and not self._pollers_alive()):
+            batch = self.next_batch()
+            if batch:
+                self.process_batch(batch)
+        self._dispatched.set()
+
+    def extend_visibility(self) -> None:
+        """Extends the messages that would become visible before the next round."""
+        interval = max(1.0, self.visibility_timeout / 3)
+        while not self._dispatched.wait(interval):
+            receipt_handles = self.in_flight.expiring(interval)
+            for chunk in chunks(receipt_handles):
+                entries = [
+                    {"Id": str(index), "ReceiptHandle": receipt_handle, "VisibilityTimeout": self.visibility_timeout}
+                    for index, receipt_handle in enumerate(chunk)
+                ]
+                try:
+                    self.sqs_client.change_message_visibility_batch(QueueUrl=self.queue_url, Entries=entries)
+                except (BotoCoreError, ClientError) as e:
+                    logger.error("Error extending visibility of %d messages: %s", len(entries), e)
+            self.in_flight.extend(receipt_handles, self.visibility_timeout)
+
+    def _pollers_alive(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads if thread.name.startswith("poller"))
+
+    def start(self) -> None:
+        self._threads = [threading.Thread(target=self.poll, name=f"poller-{index}", daemon=True) for index in range(self.pollers)]
+        self._threads.append(threading.Thread(target=self.dispatch, name="dispatcher", daemon=True))
+        self._threads.append(threading.Thread(target=self.extend_visibility, name="visibility", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stops receiving and returns once the received messages are processed, within WORKER_WAIT_SECONDS."""
+        self.stopping.set()
+        for thread in self._threads:
+            thread.join()
+
+def get_handler(consumer: str) -> Callable[[dict, object], dict]:
+    if consumer not in CONSUMERS:
+        raise ValueError(f"Unknown consumer {consumer}, expected one of {', '.join(CONSUMERS)}")
+    return importlib.import_module(CONSUMERS[consumer]).lambda_handler
+
+def run_worker(consumer: str, queue_url: str, pollers: int) -> None:
+    poller = SQSPoller(boto3.client("sqs", region_name=get_region()), queue_url, get_handler(consumer), pollers=pollers)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    poller.start()
+    logger.info("Worker %d polling %s for %s with %d pollers", os.getpid(), queue_url, consumer, pollers)
+    stopped.wait()
+    logger.info("Worker %d stopping", os.getpid())
+    poller.stop()
+    logger.info("Worker %d stopped: %d messages processed, %d failed", os.getpid(), poller.processed, poller.failed)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a sensors consumer as a long-running SQS worker")
+    parser.add_argument("--consumer", choices=sorted(CONSUMERS), default=WORKER_CONSUMER)
+    parser.add_argument("--queue-url", default=WORKER_QUEUE_URL)
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES, help="Worker processes, e.g. one per core")
+    parser.add_argument("--pollers", type=int, default=WORKER_POLLERS, help="ReceiveMessage loops per process")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.queue_url:
+        sys.exit("A queue url is required (--queue-url or WORKER_QUEUE_URL)")
+    if args.processes <= 1:
+        run_worker(args.consumer, args.queue_url, args.pollers)
+    else:
+        workers = [
+            multiprocessing.Process(target=run_worker, args=(args.consumer, args.queue_url, args.pollers), name=f"worker-{index}")
+            for index in range(args.processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        # as PID 1 of the container the parent alone gets the SIGTERM of docker stop or ECS,
+        # so it forwards it for every worker to drain its batches
+        def forward_signal(signum, frame) -> None:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+
+        signal.signal(signal.SIGTERM, forward_signal)
+        signal.signal(signal.SIGINT, forward_signal)
+        for worker in workers:
+            worker.join()